@@ -0,0 +1,139 @@
+"""
+Read-through cache for serialized incident responses.
+
+An in-process LRU with TTL sits in front of an optional shared Redis tier.
+Values are the already-serialized response bodies, so a hit is returned to
+the client without touching Postgres or re-encoding anything.
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from lru import LRUCache
+import metrics
+
+
+class IncidentCache:
+    """
+    Two-tier cache for incident lookups and list pages.
+
+    Args:
+        max_entries (int): Capacity of the in-process LRU.
+        ttl_seconds (float): Lifetime of an entry in either tier.
+        redis_url (str): Optional Redis URL for the shared tier.
+    """
+
+    LIST_PREFIX = "incidents:list:"
+    ITEM_PREFIX = "incidents:item:"
+    LIST_KEYS = "incidents:list_keys"
+
+    def __init__(self, max_entries=1024, ttl_seconds=5.0, redis_url=None):
+        self.local = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+        self._redis = None
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.invalidations = 0
+
+    def _get_redis(self):
+        if self.redis_url and self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    @classmethod
+    def item_key(cls, incident_id):
+        return f"{cls.ITEM_PREFIX}{incident_id}"
+
+    @classmethod
+    def list_key(cls, limit, offset):
+        return f"{cls.LIST_PREFIX}{limit}:{offset}"
+
+    async def get(self, key):
+        """Return the cached bytes for key, or None on a miss."""
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            metrics.CACHE_REQUESTS.labels(result='local_hit').inc()
+            return value
+
+        redis_client = self._get_redis()
+        if redis_client is not None:
+            try:
+                value = await redis_client.get(key)
+            except Exception as e:
+                print(f"Cache Redis tier unavailable: {e}")
+                value = None
+            if value is not None:
+                self.hits += 1
+                self.redis_hits += 1
+                metrics.CACHE_REQUESTS.labels(result='redis_hit').inc()
+                self.local.set(key, value)
+                return value
+
+        self.misses += 1
+        metrics.CACHE_REQUESTS.labels(result='miss').inc()
+        return None
+
+    async def set(self, key, value):
+        self.local.set(key, value)
+
+        redis_client = self._get_redis()
+        if redis_client is not None:
+            ttl_ms = max(1, int(self.ttl_seconds * 1000))
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.set(key, value, px=ttl_ms)
+                    if key.startswith(self.LIST_PREFIX):
+                        # Remember list keys so they can be dropped without SCAN
+                        pipe.sadd(self.LIST_KEYS, key)
+                    await pipe.execute()
+            except Exception as e:
+                print(f"Cache Redis tier unavailable: {e}")
+
+    async def invalidate(self, incident_id=None, incident_ids=()):
+        """
+        Drop cached list pages, and the cached items for the given incidents.
+
+        Args:
+            incident_id (str): The incident whose lookup entry changed.
+            incident_ids (iterable): Several changed incidents, e.g. from a batch update.
+        """
+        self.invalidations += 1
+        item_keys = [self.item_key(i) for i in incident_ids]
+        if incident_id is not None:
+            item_keys.append(self.item_key(incident_id))
+        self.local.delete_prefix(self.LIST_PREFIX)
+        for key in item_keys:
+            self.local.delete(key)
+
+        redis_client = self._get_redis()
+        if redis_client is not None:
+            try:
+                list_keys = await redis_client.smembers(self.LIST_KEYS)
+                keys = list(list_keys) + [self.LIST_KEYS] + item_keys
+                await redis_client.delete(*keys)
+            except Exception as e:
+                print(f"Cache Redis tier unavailable: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "redis_hits": self.redis_hits,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations,
+            "local_entries": len(self.local),
+        }
+
+
+incident_cache = IncidentCache(
+    max_entries=settings.cache_max_entries,
+    ttl_seconds=settings.cache_ttl_seconds,
+    redis_url=settings.cache_redis_url,
+)
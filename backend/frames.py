@@ -0,0 +1,124 @@
+"""
+Streaming frame proxy for FRAME_URL_MODE=proxy.
+
+GET /frames/{key} streams the object from MinIO with Range and ETag
+support. The links themselves are built in storage/frame_urls.py.
+"""
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+PROXY_CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Parse a single "bytes=" range header.
+
+    Returns:
+        tuple: (start, end) inclusive, or None to send the whole object.
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        # Multiple ranges are rare for images; a full 200 response is valid
+        return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    if not (start or end) or not all(part.isdigit() for part in (start, end) if part):
+        # Syntactically invalid ranges are ignored
+        return None
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    end = int(end) if end else size - 1
+    if end < start:
+        # Syntactically invalid (last-byte-pos before first-byte-pos)
+        return None
+    return start, min(end, size - 1)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/").strip('"') == etag for c in candidates)
+
+
+async def frame_response(key, range_header=None, if_none_match=None):
+    """
+    Stream a frame from MinIO with conditional and partial GET support.
+
+    Args:
+        key (str): Object key in the frames bucket.
+        range_header (str): The request's Range header.
+        if_none_match (str): The request's If-None-Match header.
+    """
+    from storage.minio_client import minio_client
+    from minio.error import S3Error
+
+    try:
+        stat = await run_in_threadpool(minio_client.stat_object, settings.minio_bucket, key)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject", "NotFound"):
+            raise HTTPException(status_code=404, detail="Frame not found")
+        raise HTTPException(status_code=502, detail=f"Object storage error: {e.code}")
+
+    etag = (stat.etag or "").strip('"')
+    headers = {
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes",
+        # Frames are never rewritten under the same key
+        "Cache-Control": f"private, max-age={settings.frame_cache_max_age_seconds}",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = stat.size
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    offset, length = 0, size
+    if byte_range is not None:
+        start, end = byte_range
+        offset, length = start, end - start + 1
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    if length == 0:
+        return Response(status_code=status_code, headers=headers, media_type=stat.content_type)
+
+    obj = await run_in_threadpool(
+        minio_client.get_object, settings.minio_bucket, key, offset=offset, length=length
+    )
+
+    def body():
+        # Iterated in the threadpool by StreamingResponse
+        try:
+            yield from obj.stream(PROXY_CHUNK_SIZE)
+        finally:
+            obj.close()
+            obj.release_conn()
+
+    return StreamingResponse(
+        body(),
+        status_code=status_code,
+        headers=headers,
+        media_type=stat.content_type or "image/jpeg"
+    )
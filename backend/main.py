@@ -1,41 +1,32 @@
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Request, Header, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from typing import Annotated, List, Optional
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from geoalchemy2.shape import from_shape, to_shape
-from shapely.geometry import Point
+from sqlalchemy import select, update, values, column, func, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import orjson
 import sys
 import os
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.models import Incident as IncidentModel, get_db, engine, Base
+from database.models import Incident as IncidentModel, IncidentHourlyRollup, get_db, get_engine, Base, async_session
 from config import settings
+from backend.cache import incident_cache
+from backend.ws_manager import manager, Subscription
+from backend.frames import frame_response
+from storage.frame_urls import public_frame_urls, presigned_urls, unsigned_frame_keys
+from event_schema import to_utc
+import metrics
 
-app = FastAPI(title="Smart City AI API", version="1.0.0")
-
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
-manager = ConnectionManager()
+app = FastAPI(
+    title="Smart City AI API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # Pydantic models
 class Location(BaseModel):
@@ -49,6 +40,23 @@ class IncidentCreate(BaseModel):
     timestamp: datetime
     location: Location
 
+    class Config:
+        # Ids are assigned by the server here; reject them rather than ignore them
+        extra = "forbid"
+
+    @field_validator("timestamp")
+    @classmethod
+    def timestamp_to_utc(cls, value):
+        # Stored in a naive UTC column; offsets like "Z" would fail the insert
+        return to_utc(value)
+
+class BulkIncidentCreate(IncidentCreate):
+    id: Optional[str] = None  # client-supplied idempotency id
+
+BulkIncidents = TypeAdapter(
+    Annotated[List[BulkIncidentCreate], Field(max_length=settings.bulk_max_incidents)]
+)
+
 class Incident(BaseModel):
     id: str
     incident_type: str
@@ -61,17 +69,81 @@ class Incident(BaseModel):
     class Config:
         from_attributes = True
 
-# Startup event to create tables
+class BulkIncidentResult(BaseModel):
+    inserted: int
+    duplicates: int
+    ids: List[str]
+
+# Read queries select plain columns and let PostGIS extract the coordinates,
+# so rows never go through ORM objects or shapely on the way out.
+INCIDENT_COLUMNS = (
+    IncidentModel.id,
+    IncidentModel.incident_type,
+    IncidentModel.confidence,
+    IncidentModel.frame_urls,
+    IncidentModel.timestamp,
+    IncidentModel.verification_status,
+    func.ST_Y(IncidentModel.location).label("lat"),
+    func.ST_X(IncidentModel.location).label("lon"),
+)
+
+def make_point(location):
+    """PostGIS point built in SQL, so writes don't need shapely."""
+    return func.ST_SetSRID(func.ST_MakePoint(location.lon, location.lat), 4326)
+
+async def presign_frame_urls(url_lists):
+    """
+    Sign frames missing from the presigned URL cache in a worker thread, so
+    building links afterwards (public_frame_urls(..., sign=False)) never
+    blocks the event loop on MinIO.
+    """
+    keys = unsigned_frame_keys(url for urls in url_lists for url in urls)
+    if keys:
+        await run_in_threadpool(presigned_urls.sign, keys)
+
+def incident_row_to_dict(row):
+    """
+    Convert a row selected with INCIDENT_COLUMNS to the Incident response shape.
+    Call presign_frame_urls for the rows first.
+    """
+    return {
+        "id": row.id,
+        "incident_type": row.incident_type,
+        "confidence": row.confidence,
+        "frame_urls": public_frame_urls(row.frame_urls, sign=False),
+        "timestamp": row.timestamp,
+        "location": {"lat": row.lat, "lon": row.lon},
+        "verification_status": row.verification_status,
+    }
+
+async def invalidate_cache_for_message(message):
+    """Keep this process's cache coherent with writes made by other processes."""
+    message_type = message.get("type")
+    data = message.get("data") or {}
+    if message_type in ("new_incident", "new_incidents"):
+        await incident_cache.invalidate()
+    elif message_type in ("incident_verified", "incident_merged"):
+        await incident_cache.invalidate(data.get("id"))
+    elif message_type == "incidents_verified":
+        await incident_cache.invalidate(incident_ids=[item.get("id") for item in data])
+
+manager.add_message_hook(invalidate_cache_for_message)
+
 @app.on_event("startup")
 async def startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # The schema is managed by Alembic; create_all is only a convenience for
+    # throwaway development databases
+    if settings.auto_create_schema:
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    await manager.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await manager.stop()
 
 @app.post("/incidents/create", response_model=Incident)
 async def create_incident(incident: IncidentCreate, db: AsyncSession = Depends(get_db)):
-    # Create PostGIS point
-    point = from_shape(Point(incident.location.lon, incident.location.lat), srid=4326)
-    
     # Create incident
     db_incident = IncidentModel(
         id=f"incident_{datetime.now().strftime('%Y%m%d%H%M%S%f')}",
@@ -80,25 +152,24 @@ async def create_incident(incident: IncidentCreate, db: AsyncSession = Depends(g
         timestamp=incident.timestamp,
         frame_urls=incident.frame_urls,
         verification_status="pending",
-        location=point
+        location=make_point(incident.location)
     )
     
     db.add(db_incident)
-    await db.commit()
+    with metrics.DB_COMMIT_LATENCY.labels(operation='create_incident').time():
+        await db.commit()
     await db.refresh(db_incident)
-    
-    # Extract location from geometry
-    shape = to_shape(db_incident.location)
-    location = Location(lat=shape.y, lon=shape.x)
+    await incident_cache.invalidate()
+    await presign_frame_urls([db_incident.frame_urls])
     
     # Create response
     response = Incident(
         id=db_incident.id,
         incident_type=db_incident.incident_type,
         confidence=db_incident.confidence,
-        frame_urls=db_incident.frame_urls,
+        frame_urls=public_frame_urls(db_incident.frame_urls, sign=False),
         timestamp=db_incident.timestamp,
-        location=location,
+        location=incident.location,
         verification_status=db_incident.verification_status
     )
     
@@ -110,55 +181,275 @@ async def create_incident(incident: IncidentCreate, db: AsyncSession = Depends(g
     
     return response
 
+async def read_bulk_items(request: Request):
+    """Parse a bulk request body given as a JSON array or as NDJSON."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type:
+        items = []
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            items.extend(orjson.loads(line) for line in lines if line.strip())
+        if pending.strip():
+            items.append(orjson.loads(pending))
+        return items
+    
+    items = orjson.loads(await request.body())
+    if not isinstance(items, list):
+        raise HTTPException(status_code=422, detail="Expected a JSON array of incidents")
+    return items
+
+@app.post("/incidents/bulk", response_model=BulkIncidentResult)
+async def bulk_create_incidents(request: Request, db: AsyncSession = Depends(get_db)):
+    try:
+        items = await read_bulk_items(request)
+        incidents = BulkIncidents.validate_python(items)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {e}")
+    except ValidationError as e:
+        if any(error["type"] == "too_long" for error in e.errors()):
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {settings.bulk_max_incidents} incidents per request"
+            )
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if not incidents:
+        return BulkIncidentResult(inserted=0, duplicates=0, ids=[])
+    
+    batch_prefix = f"incident_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    by_id = {}
+    for idx, incident in enumerate(incidents):
+        by_id[incident.id or f"{batch_prefix}_{idx}"] = incident
+    
+    # One INSERT for the whole batch; replays of already-stored ids are skipped
+    stmt = (
+        pg_insert(IncidentModel)
+        .values([
+            {
+                "id": incident_id,
+                "incident_type": incident.incident,
+                "confidence": incident.confidence,
+                "timestamp": incident.timestamp,
+                "frame_urls": incident.frame_urls,
+                "verification_status": "pending",
+                "location": make_point(incident.location),
+            }
+            for incident_id, incident in by_id.items()
+        ])
+        .on_conflict_do_nothing(index_elements=[IncidentModel.id])
+        .returning(IncidentModel.id)
+    )
+    result = await db.execute(stmt)
+    inserted_ids = list(result.scalars().all())
+    with metrics.DB_COMMIT_LATENCY.labels(operation='bulk_insert').time():
+        await db.commit()
+    
+    if inserted_ids:
+        await incident_cache.invalidate()
+        await presign_frame_urls(by_id[incident_id].frame_urls for incident_id in inserted_ids)
+        # A single batched notification instead of one message per incident
+        await manager.broadcast({
+            "type": "new_incidents",
+            "data": [
+                {
+                    "id": incident_id,
+                    "incident_type": by_id[incident_id].incident,
+                    "confidence": by_id[incident_id].confidence,
+                    "frame_urls": public_frame_urls(by_id[incident_id].frame_urls, sign=False),
+                    "timestamp": by_id[incident_id].timestamp,
+                    "location": by_id[incident_id].location.dict(),
+                    "verification_status": "pending",
+                }
+                for incident_id in inserted_ids
+            ]
+        })
+    
+    return BulkIncidentResult(
+        inserted=len(inserted_ids),
+        duplicates=len(incidents) - len(inserted_ids),
+        ids=inserted_ids
+    )
+
 @app.get("/incidents/list", response_model=List[Incident])
-async def list_incidents(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(IncidentModel))
-    incidents = result.scalars().all()
-    
-    response = []
-    for inc in incidents:
-        shape = to_shape(inc.location)
-        response.append(Incident(
-            id=inc.id,
-            incident_type=inc.incident_type,
-            confidence=inc.confidence,
-            frame_urls=inc.frame_urls,
-            timestamp=inc.timestamp,
-            location=Location(lat=shape.y, lon=shape.x),
-            verification_status=inc.verification_status
-        ))
+async def list_incidents(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_db)
+):
+    cache_key = incident_cache.list_key(limit, offset)
+    if settings.cache_enabled:
+        cached = await incident_cache.get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
     
-    return response
+    query = select(*INCIDENT_COLUMNS).order_by(IncidentModel.timestamp.desc()).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = (await db.execute(query)).all()
+    await presign_frame_urls(row.frame_urls for row in rows)
+    
+    # Serialize the dicts directly with orjson, skipping per-row Pydantic
+    # validation; the encoded body is what gets cached.
+    body = orjson.dumps([incident_row_to_dict(row) for row in rows])
+    if settings.cache_enabled:
+        await incident_cache.set(cache_key, body)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/incidents/export")
+async def export_incidents(batch_size: int = Query(1000, ge=1, le=10000)):
+    """Stream all incidents as NDJSON, one incident per line."""
+    async def generate():
+        # The session lives inside the generator so it stays open for the
+        # whole response; rows come off a server-side cursor in batches.
+        async with async_session() as session:
+            result = await session.stream(
+                select(*INCIDENT_COLUMNS).execution_options(yield_per=batch_size)
+            )
+            async for rows in result.partitions():
+                await presign_frame_urls(row.frame_urls for row in rows)
+                for row in rows:
+                    yield orjson.dumps(incident_row_to_dict(row)) + b"\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+STATS_BUCKETS = ("minute", "hour", "day", "week", "month")
+
+def utc_range(since, until):
+    """Query bounds as naive UTC, to compare with the naive UTC timestamp column."""
+    return (
+        to_utc(since) if since is not None else None,
+        to_utc(until) if until is not None else None,
+    )
+
+@app.get("/incidents/stats/timeseries")
+async def incident_timeseries(
+    bucket: str = "hour",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    incident_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Incident counts per time bucket, incident type and verification status."""
+    if bucket not in STATS_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"bucket must be one of {', '.join(STATS_BUCKETS)}")
+    since, until = utc_range(since, until)
+    
+    if settings.stats_use_rollup and bucket != "minute":
+        # Coarser buckets are re-aggregated from the hourly rollup table
+        source = IncidentHourlyRollup
+        time_column = IncidentHourlyRollup.bucket
+        count = func.sum(IncidentHourlyRollup.count)
+    else:
+        source = IncidentModel
+        time_column = IncidentModel.timestamp
+        count = func.count()
+    
+    bucket_start = func.date_trunc(bucket, time_column).label("bucket")
+    status = func.coalesce(source.verification_status, "pending").label("verification_status")
+    query = select(bucket_start, source.incident_type, status, count.label("count"))
+    if since is not None:
+        query = query.where(time_column >= since)
+    if until is not None:
+        query = query.where(time_column < until)
+    if incident_type is not None:
+        query = query.where(source.incident_type == incident_type)
+    query = query.group_by(bucket_start, source.incident_type, status).order_by(bucket_start)
+    
+    result = await db.execute(query)
+    return ORJSONResponse([
+        {
+            "bucket": row.bucket,
+            "incident_type": row.incident_type,
+            "verification_status": row.verification_status,
+            "count": int(row.count),
+        }
+        for row in result
+    ])
+
+@app.get("/incidents/stats/heatmap")
+async def incident_heatmap(
+    cell_size: float = 0.01,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    incident_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Incident counts per square grid cell of cell_size degrees."""
+    if cell_size <= 0:
+        raise HTTPException(status_code=422, detail="cell_size must be positive")
+    since, until = utc_range(since, until)
+    
+    cell_x = func.floor(func.ST_X(IncidentModel.location) / cell_size).label("cell_x")
+    cell_y = func.floor(func.ST_Y(IncidentModel.location) / cell_size).label("cell_y")
+    query = select(cell_x, cell_y, func.count().label("count"))
+    if since is not None:
+        query = query.where(IncidentModel.timestamp >= since)
+    if until is not None:
+        query = query.where(IncidentModel.timestamp < until)
+    if incident_type is not None:
+        query = query.where(IncidentModel.incident_type == incident_type)
+    query = query.group_by(cell_x, cell_y)
+    
+    result = await db.execute(query)
+    return ORJSONResponse([
+        {
+            # Cell centre, so clients can plot points directly
+            "lat": (row.cell_y + 0.5) * cell_size,
+            "lon": (row.cell_x + 0.5) * cell_size,
+            "count": row.count,
+        }
+        for row in result
+    ])
 
 @app.get("/incidents/{id}", response_model=Incident)
 async def get_incident(id: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(IncidentModel).where(IncidentModel.id == id))
-    incident = result.scalar_one_or_none()
+    cache_key = incident_cache.item_key(id)
+    if settings.cache_enabled:
+        cached = await incident_cache.get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
     
-    if not incident:
+    result = await db.execute(select(*INCIDENT_COLUMNS).where(IncidentModel.id == id))
+    row = result.one_or_none()
+    
+    if not row:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    shape = to_shape(incident.location)
-    return Incident(
-        id=incident.id,
-        incident_type=incident.incident_type,
-        confidence=incident.confidence,
-        frame_urls=incident.frame_urls,
-        timestamp=incident.timestamp,
-        location=Location(lat=shape.y, lon=shape.x),
-        verification_status=incident.verification_status
-    )
+    await presign_frame_urls([row.frame_urls])
+    body = orjson.dumps(incident_row_to_dict(row))
+    if settings.cache_enabled:
+        await incident_cache.set(cache_key, body)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/frames/{key:path}")
+async def get_frame(
+    key: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Stream a frame from object storage (FRAME_URL_MODE=proxy)."""
+    if settings.frame_url_mode != "proxy":
+        raise HTTPException(status_code=404, detail="Frame proxy is disabled")
+    return await frame_response(key, range_header, if_none_match)
 
 @app.post("/verify/from_llm")
 async def verify_from_llm(id: str, status: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(IncidentModel).where(IncidentModel.id == id))
-    incident = result.scalar_one_or_none()
-    
-    if not incident:
+    # One UPDATE ... RETURNING instead of loading the row to change one column
+    result = await db.execute(
+        update(IncidentModel)
+        .where(IncidentModel.id == id)
+        .values(verification_status=status)
+        .returning(IncidentModel.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    incident.verification_status = status
-    await db.commit()
+    with metrics.DB_COMMIT_LATENCY.labels(operation='update_status').time():
+        await db.commit()
+    await incident_cache.invalidate(id)
     
     # Broadcast update to WebSocket clients
     await manager.broadcast({
@@ -168,15 +459,73 @@ async def verify_from_llm(id: str, status: str, db: AsyncSession = Depends(get_d
     
     return {"id": id, "status": status}
 
+class VerificationResult(BaseModel):
+    id: str
+    status: str
+
+@app.post("/verify/from_llm/batch")
+async def verify_batch_from_llm(results: List[VerificationResult], db: AsyncSession = Depends(get_db)):
+    """Apply many verification results in a single UPDATE."""
+    if len(results) > settings.bulk_max_incidents:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.bulk_max_incidents} results per request"
+        )
+    statuses = {r.id: r.status for r in results}
+    if not statuses:
+        return {"updated": [], "missing": []}
+    
+    new_values = values(
+        column("id", String), column("status", String), name="new_status"
+    ).data(list(statuses.items()))
+    result = await db.execute(
+        update(IncidentModel)
+        .where(IncidentModel.id == new_values.c.id)
+        .values(verification_status=new_values.c.status)
+        .returning(IncidentModel.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = list(result.scalars().all())
+    with metrics.DB_COMMIT_LATENCY.labels(operation='update_statuses').time():
+        await db.commit()
+    
+    if updated:
+        await incident_cache.invalidate(incident_ids=updated)
+        await manager.broadcast({
+            "type": "incidents_verified",
+            "data": [{"id": incident_id, "status": statuses[incident_id]} for incident_id in updated]
+        })
+    
+    updated_set = set(updated)
+    return {"updated": updated, "missing": [i for i in statuses if i not in updated_set]}
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            try:
+                request = orjson.loads(text)
+                action = request.get("action")
+                if action == "subscribe":
+                    manager.subscribe(websocket, Subscription.from_message(request))
+                elif action == "unsubscribe":
+                    manager.subscribe(websocket, None)
+            except (orjson.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+                manager.send_personal(websocket, {"type": "error", "detail": f"Invalid subscription: {e}"})
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return incident_cache.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.metrics_response()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
\ No newline at end of file
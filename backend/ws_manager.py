@@ -0,0 +1,332 @@
+"""
+WebSocket connection manager with per-client send queues and Redis fan-out.
+
+Each message is serialized once, then handed to every client's bounded
+queue; a dedicated sender task per client drains it, so a stalled browser
+only fills its own queue and is evicted instead of delaying everyone else.
+A burst larger than the queue drops the oldest queued messages; a client is
+only evicted once its oldest message has waited longer than the send timeout.
+With fan-out enabled, broadcasts are published to a Redis channel and every
+API worker process delivers them to its own clients.
+
+Clients may send a subscription message to receive only the incidents they
+care about, optionally coalesced into periodic batches:
+
+    {"action": "subscribe", "incident_types": ["fire"], "min_confidence": 0.6,
+     "bbox": [min_lon, min_lat, max_lon, max_lat], "coalesce_ms": 250}
+"""
+from fastapi import WebSocket
+import asyncio
+import orjson
+import time
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+import metrics
+
+
+# Messages that describe a single incident and can be filtered per client
+INCIDENT_MESSAGE_TYPES = {"new_incident", "incident_merged"}
+# Messages whose data is a list of incidents, filtered item by item
+INCIDENT_BATCH_MESSAGE_TYPES = {"new_incidents"}
+MAX_COALESCE_MS = 5000
+
+
+class Subscription:
+    """
+    Server-side filter for the incidents a client receives.
+
+    Args:
+        incident_types (list): Incident types to receive, or None for all.
+        bbox (list): [min_lon, min_lat, max_lon, max_lat], or None for anywhere.
+        min_confidence (float): Minimum incident confidence.
+        coalesce_ms (int): Batch messages over this window; 0 sends immediately.
+    """
+
+    def __init__(self, incident_types=None, bbox=None, min_confidence=0.0, coalesce_ms=0):
+        self.incident_types = set(incident_types) if incident_types else None
+        self.bbox = tuple(float(v) for v in bbox) if bbox else None
+        self.min_confidence = float(min_confidence or 0.0)
+        self.coalesce_ms = max(0, min(int(coalesce_ms or 0), MAX_COALESCE_MS))
+
+    @classmethod
+    def from_message(cls, message: dict):
+        bbox = message.get("bbox")
+        if bbox is not None and len(bbox) != 4:
+            raise ValueError("bbox must be [min_lon, min_lat, max_lon, max_lat]")
+        return cls(
+            incident_types=message.get("incident_types"),
+            bbox=bbox,
+            min_confidence=message.get("min_confidence", 0.0),
+            coalesce_ms=message.get("coalesce_ms", 0),
+        )
+
+    def matches_incident(self, incident: dict) -> bool:
+        if self.incident_types is not None and incident.get("incident_type") not in self.incident_types:
+            return False
+        if incident.get("confidence", 0.0) < self.min_confidence:
+            return False
+        if self.bbox is not None:
+            location = incident.get("location") or {}
+            lon, lat = location.get("lon"), location.get("lat")
+            if lon is None or lat is None:
+                return False
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+                return False
+        return True
+
+    def matches(self, message: dict) -> bool:
+        # Status updates and other control messages go to every client
+        if message.get("type") not in INCIDENT_MESSAGE_TYPES:
+            return True
+        return self.matches_incident(message.get("data") or {})
+
+    def to_dict(self):
+        return {
+            "incident_types": sorted(self.incident_types) if self.incident_types else None,
+            "bbox": list(self.bbox) if self.bbox else None,
+            "min_confidence": self.min_confidence,
+            "coalesce_ms": self.coalesce_ms,
+        }
+
+
+class ClientConnection:
+    """A connected WebSocket together with its outgoing queue and sender task."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sender_task = None
+        self.subscription = None
+
+
+class ConnectionManager:
+    """
+    Tracks WebSocket clients and broadcasts messages to them.
+
+    Args:
+        queue_size (int): Maximum queued messages per client; bursts beyond it drop the oldest.
+        send_timeout (float): Seconds a single send may take before eviction.
+        redis_url (str): Redis URL for cross-process fan-out, or None for local only.
+        channel (str): Redis pub/sub channel used for fan-out.
+    """
+
+    def __init__(self, queue_size=100, send_timeout=5.0, redis_url=None, channel="ws_broadcast"):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.redis_url = redis_url
+        self.channel = channel
+        self.clients = {}
+        self._redis = None
+        self._listener_task = None
+        self._message_hooks = []
+
+    def add_message_hook(self, hook):
+        """
+        Register an async callback run for every message received through fan-out.
+
+        This includes notifications published by other processes such as the
+        Celery workers, so hooks are the place to react to writes made elsewhere.
+        """
+        self._message_hooks.append(hook)
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        client = ClientConnection(websocket, self.queue_size)
+        client.sender_task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
+        metrics.WS_CLIENTS.set(len(self.clients))
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        metrics.WS_CLIENTS.set(len(self.clients))
+        if client and client.sender_task and client.sender_task is not asyncio.current_task():
+            client.sender_task.cancel()
+
+    def subscribe(self, websocket: WebSocket, subscription: Subscription):
+        """Replace the client's filter; None receives everything again."""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        client.subscription = subscription
+        self.send_personal(websocket, {
+            "type": "subscribed",
+            "data": subscription.to_dict() if subscription else None,
+        })
+
+    def send_personal(self, websocket: WebSocket, message: dict):
+        """Queue a message for a single client, keeping its sends ordered."""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        self._enqueue(client, time.monotonic(), orjson.dumps(message).decode("utf-8"))
+
+    def _enqueue(self, client: ClientConnection, enqueued_at: float, text: str):
+        """
+        Queue a message for a client, making room if the queue is full.
+
+        deliver() queues synchronously for every client, so a burst can fill
+        the queue of a healthy client before its sender gets to run. A full
+        queue therefore only evicts when the oldest message has been waiting
+        longer than the send timeout; otherwise that message is dropped.
+        """
+        if client.queue.full():
+            oldest_at, _ = client.queue.get_nowait()
+            if enqueued_at - oldest_at > self.send_timeout:
+                self._evict(client)
+                return
+            metrics.WS_DROPPED.inc()
+        client.queue.put_nowait((enqueued_at, text))
+
+    async def _next_batch(self, client: ClientConnection, coalesce_ms: int):
+        """Collect everything queued within the coalescing window.
+
+        Returns:
+            tuple: (enqueue time of the oldest item, batch text)
+        """
+        items = [await client.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + coalesce_ms / 1000
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(client.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Items are already-serialized JSON, so the batch is assembled as text
+        return items[0][0], '{"type":"batch","data":[' + ",".join(text for _, text in items) + "]}"
+
+    async def _sender(self, client: ClientConnection):
+        try:
+            while True:
+                subscription = client.subscription
+                if subscription is not None and subscription.coalesce_ms > 0:
+                    enqueued_at, text = await self._next_batch(client, subscription.coalesce_ms)
+                else:
+                    enqueued_at, text = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(text), self.send_timeout)
+                metrics.WS_SEND_LAG.observe(time.monotonic() - enqueued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dropping WebSocket client after send failure: {e!r}")
+            metrics.WS_EVICTIONS.inc()
+            self.disconnect(client.websocket)
+
+    def _evict(self, client: ClientConnection):
+        print("Evicting slow WebSocket client (send queue stalled)")
+        metrics.WS_EVICTIONS.inc()
+        self.disconnect(client.websocket)
+        # 1013 = try again later; the client is expected to reconnect
+        asyncio.create_task(self._close_quietly(client.websocket, code=1013))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def deliver(self, payload: bytes, message: dict = None):
+        """
+        Queue an already-serialized message for every matching local client.
+
+        Args:
+            payload (bytes): The serialized message.
+            message (dict): The same message decoded, parsed from payload if omitted.
+        """
+        text = payload.decode("utf-8")
+        enqueued_at = time.monotonic()
+        for client in list(self.clients.values()):
+            client_text = text
+            if client.subscription is not None:
+                if message is None:
+                    message = orjson.loads(payload)
+                if message.get("type") in INCIDENT_BATCH_MESSAGE_TYPES:
+                    client_text = self._filter_batch(client.subscription, message, text)
+                    if client_text is None:
+                        continue
+                elif not client.subscription.matches(message):
+                    continue
+            self._enqueue(client, enqueued_at, client_text)
+
+    @staticmethod
+    def _filter_batch(subscription: Subscription, message: dict, text: str):
+        """Return the batch text narrowed to the subscription, or None if nothing matches."""
+        incidents = message.get("data") or []
+        matching = [inc for inc in incidents if subscription.matches_incident(inc)]
+        if not matching:
+            return None
+        if len(matching) == len(incidents):
+            return text
+        return orjson.dumps({**message, "data": matching}).decode("utf-8")
+
+    async def broadcast(self, message: dict):
+        payload = orjson.dumps(message)
+        if self._redis is not None:
+            try:
+                await self._redis.publish(self.channel, payload)
+                return
+            except Exception as e:
+                print(f"WebSocket fan-out publish failed, delivering locally: {e}")
+        self.deliver(payload, message)
+
+    async def _listen(self):
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = message["data"]
+                    decoded = orjson.loads(payload)
+                    for hook in self._message_hooks:
+                        try:
+                            await hook(decoded)
+                        except Exception as e:
+                            print(f"WebSocket fan-out hook failed: {e}")
+                    self.deliver(payload, decoded)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WebSocket fan-out listener error: {e}; retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def start(self):
+        """Start the Redis fan-out listener if fan-out is configured."""
+        if self.redis_url and self._listener_task is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url)
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            self._listener_task = None
+        for websocket in list(self.clients):
+            self.disconnect(websocket)
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+manager = ConnectionManager(
+    queue_size=settings.ws_queue_size,
+    send_timeout=settings.ws_send_timeout_seconds,
+    redis_url=settings.ws_fanout_redis_url if settings.ws_fanout_enabled else None,
+    channel=settings.ws_fanout_channel,
+)
@@ -0,0 +1,233 @@
+"""
+Offline benchmark for the vision pipeline
+
+Runs YOLOv11Nano and the incident logic (rules, tracker, frame encoding)
+over a local video file or synthetic frames, with no display and with
+MinIO/Redis replaced by in-process stubs. Reports per-stage latency
+percentiles, end-to-end fps and peak RSS.
+
+Usage:
+    python benchmark_pipeline.py --video samples/junction.mp4 --json bench.json
+    python benchmark_pipeline.py --synthetic 1920x1080 --frames 300
+    python benchmark_pipeline.py --video samples/junction.mp4 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import settings
+from vision.yolov11_pipeline import YOLOv11Nano, StreamProcessor, load_rules
+
+STAGES = ["decode", "preprocess", "inference", "postprocess", "rule_eval", "encode", "total"]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, or None if unavailable."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return None
+
+
+def video_frames(path, limit=None):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Unable to open video: {path}")
+    count = 0
+    try:
+        while limit is None or count < limit:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            count += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def synthetic_frames(size, limit):
+    """Noise background with a few moving rectangles, so every stage does real work."""
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(limit):
+        frame = background.copy()
+        for k in range(4):
+            x = int((i * (3 + k) + k * width / 4) % (width - 120))
+            y = int(height / 2 + k * 40) % (height - 120)
+            cv2.rectangle(frame, (x, y), (x + 100, y + 100), (40 * k, 200, 255 - 40 * k), -1)
+        yield frame
+
+
+class StubSinks:
+    """Stand-ins for MinIO uploads and Redis publishing that record encode cost."""
+
+    def __init__(self):
+        self.encode_ms = 0.0
+        self.events = []
+        self.uploaded_bytes = 0
+
+    def upload(self, frames, incident_id):
+        keys = []
+        t0 = time.perf_counter()
+        for idx, frame in enumerate(frames):
+            _, buffer = cv2.imencode('.jpg', frame)
+            self.uploaded_bytes += len(buffer)
+            keys.append(f"{incident_id}_f{idx+1}.jpg")
+        self.encode_ms += (time.perf_counter() - t0) * 1000
+        return keys
+
+    def publish(self, event):
+        self.events.append(event)
+
+
+def run_benchmark(frames, model, processor, sinks, warmup=10):
+    timings = {stage: [] for stage in STAGES}
+    detections_per_frame = []
+    # Synthetic timestamps at 25 fps keep tracker/cooldown behaviour deterministic
+    start_time = datetime.now()
+    frame_iter = iter(frames)
+    index = 0
+    wall_start = None
+
+    while True:
+        t_start = time.perf_counter()
+        frame = next(frame_iter, None)
+        if frame is None:
+            break
+        t_decode = time.perf_counter()
+
+        windows = processor.rules.inference_windows(frame.shape)
+        batch = model.preprocess_windows(frame, windows)
+        t_pre = time.perf_counter()
+
+        outputs = model.run_batch(batch)
+        t_inf = time.perf_counter()
+
+        detections = model.postprocess_windows(outputs, windows)
+        t_post = time.perf_counter()
+
+        sinks.encode_ms = 0.0
+        processor.process_frame(frame, detections, start_time + timedelta(milliseconds=40 * index))
+        t_rules = time.perf_counter()
+
+        if index == warmup:
+            wall_start = t_start
+        if index >= warmup:
+            encode_ms = sinks.encode_ms
+            timings["decode"].append((t_decode - t_start) * 1000)
+            timings["preprocess"].append((t_pre - t_decode) * 1000)
+            timings["inference"].append((t_inf - t_pre) * 1000)
+            timings["postprocess"].append((t_post - t_inf) * 1000)
+            timings["rule_eval"].append((t_rules - t_post) * 1000 - encode_ms)
+            timings["encode"].append(encode_ms)
+            timings["total"].append((t_rules - t_start) * 1000)
+            detections_per_frame.append(len(detections.scores))
+        index += 1
+
+    measured = len(timings["total"])
+    if measured == 0:
+        raise SystemExit(f"Not enough frames: need more than {warmup} warm-up frames")
+    elapsed = time.perf_counter() - wall_start
+
+    def summarize(values):
+        values = np.asarray(values)
+        return {
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(values.max()),
+        }
+
+    return {
+        "frames": measured,
+        "fps": measured / elapsed,
+        "stages_ms": {stage: summarize(values) for stage, values in timings.items()},
+        "detections_per_frame": float(np.mean(detections_per_frame)),
+        "incidents": len(sinks.events),
+        "uploaded_mb": sinks.uploaded_bytes / 1e6,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"\nFrames: {report['frames']}   FPS: {report['fps']:.1f}   "
+          f"Peak RSS: {report['peak_rss_mb'] or 0:.0f} MB   Incidents: {report['incidents']}")
+    header = f"{'stage':<12} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    if baseline:
+        header += f" {'Δp50':>9}"
+    print(header)
+    for stage in STAGES:
+        s = report["stages_ms"][stage]
+        line = f"{stage:<12} {s['mean']:>8.2f} {s['p50']:>8.2f} {s['p95']:>8.2f} {s['p99']:>8.2f}"
+        if baseline:
+            base = baseline["stages_ms"][stage]["p50"]
+            delta = (s["p50"] - base) / base * 100 if base else 0.0
+            line += f" {delta:>+8.1f}%"
+        print(line)
+    if baseline:
+        print(f"FPS change vs baseline: {(report['fps'] / baseline['fps'] - 1) * 100:+.1f}%")
+
+
+def parse_size(value):
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline vision pipeline benchmark")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--video", help="Local video file")
+    source.add_argument("--synthetic", type=parse_size, metavar="WxH", help="Generate synthetic frames")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to process")
+    parser.add_argument("--warmup", type=int, default=10, help="Frames excluded from statistics")
+    parser.add_argument("--model", default=settings.yolo_model_path)
+    parser.add_argument("--camera", default=settings.camera_id)
+    parser.add_argument("--json", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    args = parser.parse_args()
+
+    rules = load_rules()
+    model = YOLOv11Nano(
+        model_path=args.model,
+        confidence_threshold=min(settings.confidence_threshold, rules.for_camera(args.camera).min_threshold)
+    )
+    sinks = StubSinks()
+    processor = StreamProcessor(camera_id=args.camera, rules=rules, upload_fn=sinks.upload, publish_fn=sinks.publish)
+
+    total = args.frames + args.warmup
+    frames = video_frames(args.video, total) if args.video else synthetic_frames(args.synthetic, total)
+    report = run_benchmark(frames, model, processor, sinks, warmup=args.warmup)
+    report["model"] = args.model
+    report["source"] = args.video or f"synthetic {args.synthetic[0]}x{args.synthetic[1]}"
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = '0002_incident_stats_rollup'
+down_revision = '0001_create_incidents_table'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'incident_hourly_rollup',
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('incident_type', sa.String(), nullable=False),
+        sa.Column('verification_status', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('bucket', 'incident_type', 'verification_status')
+    )
+    # Time-range scans for the stats endpoints and the rollup refresh
+    op.create_index('ix_incidents_timestamp', 'incidents', ['timestamp'])
+    op.create_index('ix_incidents_type_timestamp', 'incidents', ['incident_type', 'timestamp'])
+    # Backfill from existing history so stats don't start out empty
+    op.execute(
+        """
+        INSERT INTO incident_hourly_rollup (bucket, incident_type, verification_status, count)
+        SELECT date_trunc('hour', timestamp), incident_type,
+               coalesce(verification_status, 'pending'), count(*)
+        FROM incidents
+        GROUP BY 1, 2, 3
+        """
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_incidents_type_timestamp', table_name='incidents')
+    op.drop_index('ix_incidents_timestamp', table_name='incidents')
+    op.drop_table('incident_hourly_rollup')
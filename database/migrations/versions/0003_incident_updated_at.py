@@ -0,0 +1,31 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = '0003_incident_updated_at'
+down_revision = '0002_incident_stats_rollup'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Lets the rollup refresh rebuild only the hours whose rows changed
+    op.add_column(
+        'incidents',
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False)
+    )
+    op.create_index('ix_incidents_updated_at', 'incidents', ['updated_at'])
+    # Rebuild the rollup in full, in case it drifted before changes were tracked
+    op.execute("DELETE FROM incident_hourly_rollup")
+    op.execute(
+        """
+        INSERT INTO incident_hourly_rollup (bucket, incident_type, verification_status, count)
+        SELECT date_trunc('hour', timestamp), incident_type,
+               coalesce(verification_status, 'pending'), count(*)
+        FROM incidents
+        GROUP BY 1, 2, 3
+        """
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_incidents_updated_at', table_name='incidents')
+    op.drop_column('incidents', 'updated_at')
@@ -1,9 +1,6 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, String, Float, JSON, DateTime
+from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, String, Float, JSON, DateTime, Integer, Index, func
 from geoalchemy2 import Geometry
-from geoalchemy2.shape import to_shape
-from shapely.geometry import Point
 import sys
 import os
 
@@ -13,11 +10,33 @@ from config import settings
 
 DATABASE_URL = settings.database_url
 
-# Create async engine and session
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session = sessionmaker(
-    bind=engine, class_=AsyncSession, expire_on_commit=False
-)
+# The engine and session factory are created on first use, so importing the
+# models (API, workers, Alembic) doesn't load the async driver or build a pool
+_engine = None
+_session_factory = None
+
+def get_engine():
+    """Return the shared async engine, creating it on first call."""
+    global _engine
+    if _engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        _engine = create_async_engine(DATABASE_URL, echo=True)
+    return _engine
+
+def async_session():
+    """Open a new AsyncSession; use as `async with async_session() as session`."""
+    global _session_factory
+    if _session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _session_factory = async_sessionmaker(bind=get_engine(), expire_on_commit=False)
+    return _session_factory()
+
+def __getattr__(name):
+    # Keeps `from database.models import engine` working without creating
+    # the engine at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 Base = declarative_base()
 
@@ -28,10 +47,25 @@ class Incident(Base):
     id = Column(String, primary_key=True)
     incident_type = Column(String, nullable=False)
     confidence = Column(Float, nullable=False)
-    timestamp = Column(DateTime, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
     frame_urls = Column(JSON, nullable=False)
     verification_status = Column(String, default="pending")
     location = Column(Geometry("POINT"), nullable=False)
+    # Set on every insert/update; the rollup refresh rebuilds the hours of changed rows
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now(), index=True)
+
+    __table_args__ = (
+        Index("ix_incidents_type_timestamp", "incident_type", "timestamp"),
+    )
+
+# Hourly incident counts, refreshed incrementally by a Celery task
+class IncidentHourlyRollup(Base):
+    __tablename__ = "incident_hourly_rollup"
+
+    bucket = Column(DateTime, primary_key=True)
+    incident_type = Column(String, primary_key=True)
+    verification_status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
 
 # Dependency for database session
 async def get_db():
@@ -0,0 +1,160 @@
+"""
+Compact wire format for incident events passed between pipeline stages.
+
+Events travel vision pipeline -> Redis 'events' -> redis_consumer -> Celery.
+On the wire an event is a msgpack array instead of a JSON object:
+
+    [version, id, incident, confidence, timestamp_ms, lat, lon, frame_keys, camera_id]
+
+Timestamps are UTC epoch milliseconds and frames are MinIO object keys rather
+than full URLs, so every hop moves and parses far fewer bytes. The consumer
+forwards the encoded bytes to Celery unchanged.
+
+decode_event() also accepts the legacy JSON events (and dicts already
+decoded by Celery's JSON serializer), so old publishers and tasks queued
+before an upgrade keep working. Decoded events are dicts with the familiar
+keys; 'timestamp' is a naive UTC datetime (as stored in the database) and
+'frames' holds object keys. Aware datetimes are converted to UTC on encode;
+naive ones are taken to be UTC already, never local time, so producers and
+workers in different time zones agree. Use
+event_to_dict() to get the legacy JSON-friendly shape with full URLs.
+"""
+from datetime import datetime, timedelta, timezone
+import json
+
+import msgpack
+
+from config import settings
+
+SCHEMA_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+
+def frame_base_url(bucket=None):
+    protocol = "https" if settings.minio_secure else "http"
+    return f"{protocol}://{settings.minio_endpoint}/{bucket or settings.minio_bucket}/"
+
+
+def frame_key(frame):
+    """Object key for a frame given either a key or a URL in the frames bucket."""
+    base = frame_base_url()
+    return frame[len(base):] if frame.startswith(base) else frame
+
+
+def frame_url(key):
+    """Full URL for an object key; values that are already URLs pass through."""
+    return key if "://" in key else frame_base_url() + key
+
+
+def to_utc(value):
+    """Naive UTC datetime for an aware datetime, or a naive one assumed to be UTC."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _from_epoch_ms(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _parse_timestamp(value):
+    if isinstance(value, datetime):
+        return to_utc(value)
+    if isinstance(value, (int, float)):
+        return _from_epoch_ms(value)
+    return to_utc(datetime.fromisoformat(value))
+
+
+def _from_dict(event):
+    location = event.get('location') or {}
+    return {
+        "id": event['id'],
+        "incident": event['incident'],
+        "confidence": float(event['confidence']),
+        "frames": [frame_key(f) for f in event.get('frames', [])],
+        "timestamp": _parse_timestamp(event['timestamp']),
+        "location": {"lat": location.get('lat'), "lon": location.get('lon')},
+        "camera_id": event.get('camera_id'),
+    }
+
+
+def encode_event(event, wire_format=None):
+    """
+    Serialize an event for publishing.
+
+    Args:
+        event (dict): Event with id, incident, confidence, frames (keys or URLs),
+            timestamp (datetime or ISO string; naive means UTC), location and optional camera_id.
+        wire_format (str): 'msgpack' or 'json'; defaults to settings.event_wire_format.
+
+    Returns:
+        bytes: The encoded event.
+    """
+    event = _from_dict(event)
+    if (wire_format or settings.event_wire_format) == "json":
+        return json.dumps(event_to_dict(event)).encode("utf-8")
+    return msgpack.packb([
+        SCHEMA_VERSION,
+        event['id'],
+        event['incident'],
+        event['confidence'],
+        (event['timestamp'] - EPOCH) // timedelta(milliseconds=1),
+        event['location']['lat'],
+        event['location']['lon'],
+        event['frames'],
+        event['camera_id'],
+    ], use_bin_type=True)
+
+
+def decode_event(payload):
+    """
+    Decode an event from msgpack bytes, legacy JSON bytes/str or a legacy dict.
+
+    Returns:
+        dict: The decoded event ('timestamp' is a naive UTC datetime, 'frames' are object keys).
+
+    Raises:
+        ValueError: If the payload is malformed or uses an unknown schema version.
+    """
+    if isinstance(payload, dict):
+        return _from_dict(payload)
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    # A msgpack event is an array, so a leading '{' can only be legacy JSON
+    if payload[:1] == b"{":
+        return _from_dict(json.loads(payload))
+
+    try:
+        record = msgpack.unpackb(payload, raw=False)
+    except ValueError as e:
+        raise ValueError(f"Malformed event payload: {e}") from e
+    if not isinstance(record, list) or not record:
+        raise ValueError("Malformed event payload: expected an event array")
+    if record[0] != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported event schema version: {record[0]}")
+    if len(record) < 9:
+        raise ValueError("Malformed event payload: missing fields")
+
+    _, event_id, incident, confidence, timestamp_ms, lat, lon, frames, camera_id = record[:9]
+    return {
+        "id": event_id,
+        "incident": incident,
+        "confidence": confidence,
+        "frames": frames,
+        "timestamp": _from_epoch_ms(timestamp_ms),
+        "location": {"lat": lat, "lon": lon},
+        "camera_id": camera_id,
+    }
+
+
+def event_to_dict(event):
+    """Legacy JSON shape of a decoded event: ISO timestamp and full frame URLs."""
+    return {
+        "id": event['id'],
+        "incident": event['incident'],
+        "confidence": event['confidence'],
+        "frames": [frame_url(k) for k in event['frames']],
+        "timestamp": event['timestamp'].isoformat(),
+        "location": event['location'],
+        "camera_id": event.get('camera_id'),
+    }
@@ -0,0 +1,48 @@
+"""
+Small in-process LRU cache with a per-entry time-to-live.
+
+Shared by the API's incident cache (backend/cache.py) and the presigned
+frame URL cache (storage/frame_urls.py), so neither package depends on
+the other.
+"""
+from collections import OrderedDict
+import time
+
+
+class LRUCache:
+    """Small LRU mapping with a per-entry time-to-live."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=5.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
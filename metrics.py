@@ -0,0 +1,125 @@
+"""
+Shared Prometheus instrumentation for the vision pipeline, workers and API.
+
+All metrics are defined here so names and labels stay consistent across
+processes. The API exposes them on /metrics; the vision pipeline, the Redis
+consumer and the Celery worker call start_metrics_server() to expose their
+own. If prometheus_client is not installed, every metric is a no-op.
+
+For multi-process setups (the vision supervisor), set PROMETHEUS_MULTIPROC_DIR
+before importing this module; the exporter then aggregates all processes.
+"""
+from contextlib import nullcontext
+import os
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, start_http_server,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    Counter = Gauge = Histogram = None
+    PROMETHEUS_AVAILABLE = False
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is unavailable."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+def _metric(metric_type, name, documentation, labelnames=(), **kwargs):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    if metric_type is Gauge and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        kwargs.setdefault("multiprocess_mode", "livesum")
+    return metric_type(name, documentation, labelnames, **kwargs)
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Vision pipeline
+FRAMES_READ = _metric(Counter, "vision_frames_read_total", "Frames decoded from the stream", ["camera"])
+FRAMES_DROPPED = _metric(Counter, "vision_frames_dropped_total", "Frames dropped because inference was behind", ["camera"])
+INFERENCE_LATENCY = _metric(Histogram, "vision_inference_seconds", "Preprocess + model run + postprocess time", buckets=LATENCY_BUCKETS)
+DETECTIONS_PER_FRAME = _metric(Histogram, "vision_detections_per_frame", "Detections returned per frame", ["camera"],
+                               buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+INCIDENTS_FIRED = _metric(Counter, "vision_incidents_fired_total", "Incidents triggered by the pipeline", ["camera", "incident_type"])
+UPLOAD_LATENCY = _metric(Histogram, "vision_frame_upload_seconds", "Time to encode and upload one frame", buckets=LATENCY_BUCKETS)
+UPLOAD_BYTES = _metric(Counter, "vision_frame_upload_bytes_total", "Encoded frame bytes uploaded to object storage")
+
+# Ingest (consumer and Celery workers)
+EVENTS_RECEIVED = _metric(Counter, "ingest_events_received_total", "Events received by the Redis consumer")
+QUEUE_DEPTH = _metric(Gauge, "ingest_queue_depth", "Messages waiting in the Celery broker queue", ["queue"])
+TASK_DURATION = _metric(Histogram, "worker_task_seconds", "Celery task run time", ["task", "state"], buckets=LATENCY_BUCKETS)
+DB_COMMIT_LATENCY = _metric(Histogram, "db_commit_seconds", "Database write + commit time", ["operation"], buckets=LATENCY_BUCKETS)
+
+# LLM verification dispatcher
+LLM_REQUESTS = _metric(Counter, "llm_requests_total", "Requests to the LLM verification service", ["result"])
+LLM_LATENCY = _metric(Histogram, "llm_request_seconds", "LLM verification request time", buckets=LATENCY_BUCKETS)
+LLM_BREAKER_OPEN = _metric(Gauge, "llm_circuit_open", "1 while the LLM circuit breaker is open")
+LLM_DEAD_LETTERED = _metric(Counter, "llm_dead_lettered_total", "Events given up on after repeated LLM failures")
+
+# API
+WS_CLIENTS = _metric(Gauge, "api_websocket_clients", "Connected WebSocket clients")
+WS_SEND_LAG = _metric(Histogram, "api_websocket_send_lag_seconds", "Time from broadcast to completed send", buckets=LATENCY_BUCKETS)
+WS_EVICTIONS = _metric(Counter, "api_websocket_evictions_total", "WebSocket clients evicted as slow or failed")
+WS_DROPPED = _metric(Counter, "api_websocket_dropped_messages_total", "Oldest queued messages dropped to absorb a burst")
+CACHE_REQUESTS = _metric(Counter, "api_cache_requests_total", "Incident cache lookups", ["result"])
+
+
+def _registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return None
+
+
+def metrics_response():
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return b"# prometheus_client is not installed\n", CONTENT_TYPE_LATEST
+    registry = _registry()
+    return (generate_latest(registry) if registry else generate_latest()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port):
+    """
+    Expose metrics over HTTP on the given port from a background thread.
+
+    Args:
+        port (int): Port to listen on; 0 or None disables the exporter.
+    """
+    if not PROMETHEUS_AVAILABLE or not port:
+        return
+    registry = _registry()
+    if registry:
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
+    print(f"Metrics exporter listening on :{port}/metrics")
@@ -0,0 +1,119 @@
+"""
+Import-time profile for the service entry points
+
+Imports each entry point module in a fresh interpreter with
+`python -X importtime` and reports the total import time and the slowest
+modules (cumulative), so regressions in startup time are easy to spot.
+
+Usage:
+    python profile_imports.py
+    python profile_imports.py --modules backend.main tasks.redis_consumer --top 15
+    python profile_imports.py --json imports.json --compare baseline.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = [
+    "backend.main",
+    "tasks.celery_worker",
+    "tasks.redis_consumer",
+    "vision.yolov11_pipeline",
+]
+
+
+def run_importtime(code):
+    """Run code under -X importtime; returns (returncode, {module: (cumulative_ms, self_ms)}, stderr)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    imports = {}
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            imports[name.strip()] = (int(cumulative_us) / 1000, int(self_us) / 1000)
+        except ValueError:
+            continue
+    return proc.returncode, imports, proc.stderr
+
+
+def profile_module(module, runs=3):
+    """
+    Import a module in fresh interpreters and keep the fastest run.
+
+    Returns:
+        dict: total_ms and per-module (cumulative, self) times, or error.
+    """
+    # Modules loaded by interpreter startup (site, encodings, ...) are not
+    # attributable to the entry point
+    _, startup, _ = run_importtime("pass")
+    best = None
+    for _ in range(runs):
+        returncode, imports, stderr = run_importtime(f"import {module}")
+        if returncode != 0:
+            error = stderr.strip().splitlines()[-1] if stderr.strip() else "import failed"
+            return {"module": module, "error": error}
+
+        imports = {name: times for name, times in imports.items() if name not in startup}
+        total_ms = imports.get(module, (sum(s for _, s in imports.values()), 0))[0]
+        if best is None or total_ms < best["total_ms"]:
+            best = {"module": module, "total_ms": total_ms, "imports": imports}
+    return best
+
+
+def print_report(results, top=10, baseline=None):
+    baseline = {r["module"]: r for r in baseline or [] if "error" not in r}
+    for result in results:
+        print(f"\n{'='*60}")
+        if "error" in result:
+            print(f"{result['module']}: {result['error']}")
+            continue
+        line = f"{result['module']}: {result['total_ms']:.0f} ms"
+        base = baseline.get(result["module"])
+        if base:
+            line += f" ({result['total_ms'] - base['total_ms']:+.0f} ms vs baseline)"
+        print(line)
+        # Top-level packages only, so the list names what to defer
+        packages = {}
+        for name, (cumulative, _) in result["imports"].items():
+            root = name.split(".")[0]
+            packages[root] = max(packages.get(root, 0.0), cumulative)
+        packages.pop(result["module"].split(".")[0], None)
+        print(f"{'package':<30} {'cumulative ms':>14}")
+        for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            print(f"{name:<30} {cumulative:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of service entry points")
+    parser.add_argument("--modules", nargs="+", default=ENTRY_POINTS)
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list per module")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per module (fastest kept)")
+    parser.add_argument("--json", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    args = parser.parse_args()
+
+    results = [profile_module(module, args.runs) for module in args.modules]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, args.top, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
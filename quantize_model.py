@@ -0,0 +1,249 @@
+"""
+Produce INT8 / FP16 variants of the YOLOv11-nano ONNX model and compare them
+
+Usage:
+    python quantize_model.py int8 --calibration-dir samples/frames
+    python quantize_model.py fp16
+    python quantize_model.py compare --images samples/frames \
+        --candidates models/yolov11-nano.int8.onnx models/yolov11-nano.fp16.onnx
+
+Point YOLO_MODEL_PATH at a variant to run the pipeline with it.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import settings
+from vision.yolov11_pipeline import YOLOv11Nano, preprocess_frame
+from vision.tracker import iou_matrix
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+def list_images(directory, limit=None):
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        raise SystemExit(f"No images found in {directory}")
+    return paths[:limit] if limit else paths
+
+
+def variant_path(model_path, suffix):
+    path = Path(model_path)
+    return str(path.with_name(f"{path.stem}.{suffix}{path.suffix}"))
+
+
+class FrameCalibrationReader:
+    """Feeds preprocessed sample frames to the static quantization calibrator."""
+
+    def __init__(self, image_paths, input_name, input_size=(640, 640)):
+        self.input_name = input_name
+        self.input_size = input_size
+        self._paths = iter(image_paths)
+
+    def get_next(self):
+        for path in self._paths:
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                return {self.input_name: preprocess_frame(frame, self.input_size)}
+        return None
+
+
+def quantize_int8(model_path, output_path, calibration_dir, max_images=200, per_channel=False):
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = ort.InferenceSession(model_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    images = list_images(calibration_dir, max_images)
+    print(f"Calibrating on {len(images)} frames from {calibration_dir}...")
+
+    # Shape inference and graph cleanup make quantization cover more nodes
+    prepared_path = variant_path(output_path, "prep")
+    quant_pre_process(model_path, prepared_path)
+    try:
+        quantize_static(
+            prepared_path,
+            output_path,
+            FrameCalibrationReader(images, input_name),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    finally:
+        if os.path.exists(prepared_path):
+            os.remove(prepared_path)
+    print(f"✓ INT8 model written to {output_path}")
+
+
+def convert_fp16(model_path, output_path):
+    import onnx
+    from onnxconverter_common import float16
+
+    model = onnx.load(model_path)
+    # Keep float32 inputs/outputs so callers don't need to change dtypes
+    model_fp16 = float16.convert_float_to_float16(model, keep_io_types=True)
+    onnx.save(model_fp16, output_path)
+    print(f"✓ FP16 model written to {output_path}")
+
+
+def nms(detections, iou_threshold=0.45):
+    """Class-wise NMS so duplicate raw boxes don't skew the comparison."""
+    boxes, scores, class_ids = detections
+    keep = []
+    for class_id in np.unique(class_ids):
+        idx = np.flatnonzero(class_ids == class_id)
+        xywh = np.concatenate([boxes[idx, :2], boxes[idx, 2:] - boxes[idx, :2]], axis=1)
+        kept = cv2.dnn.NMSBoxes(xywh.tolist(), scores[idx].tolist(), 0.0, iou_threshold)
+        keep.extend(idx[np.asarray(kept, dtype=np.int64).reshape(-1)])
+    keep = np.array(sorted(keep), dtype=np.int64)
+    return boxes[keep], scores[keep], class_ids[keep]
+
+
+def average_precision(reference, candidate, iou_threshold=0.5):
+    """
+    mAP@iou_threshold of candidate detections, treating reference detections as ground truth.
+
+    Args:
+        reference (list): Per image (boxes, scores, class_ids) from the baseline model.
+        candidate (list): Per image (boxes, scores, class_ids) from the variant.
+    """
+    classes = set()
+    for _, _, class_ids in reference:
+        classes.update(class_ids.tolist())
+    if not classes:
+        return None
+
+    aps = []
+    for class_id in sorted(classes):
+        num_gt = sum(int((ref[2] == class_id).sum()) for ref in reference)
+        scored = []
+        for image_idx, (boxes, scores, class_ids) in enumerate(candidate):
+            for box, score in zip(boxes[class_ids == class_id], scores[class_ids == class_id]):
+                scored.append((float(score), image_idx, box))
+        scored.sort(key=lambda item: -item[0])
+
+        matched = [np.zeros(int((ref[2] == class_id).sum()), dtype=bool) for ref in reference]
+        tp = np.zeros(len(scored))
+        for rank, (_, image_idx, box) in enumerate(scored):
+            gt_boxes = reference[image_idx][0][reference[image_idx][2] == class_id]
+            if len(gt_boxes) == 0:
+                continue
+            ious = iou_matrix(box[None, :], gt_boxes)[0]
+            ious[matched[image_idx]] = -1
+            best = int(np.argmax(ious))
+            if ious[best] >= iou_threshold:
+                matched[image_idx][best] = True
+                tp[rank] = 1
+
+        if not scored:
+            aps.append(0.0)
+            continue
+        cum_tp = np.cumsum(tp)
+        recall = cum_tp / num_gt
+        precision = cum_tp / np.arange(1, len(scored) + 1)
+        # All-point interpolation of the precision/recall curve
+        recall = np.concatenate([[0.0], recall, [1.0]])
+        precision = np.concatenate([[1.0], precision, [0.0]])
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        steps = np.flatnonzero(recall[1:] != recall[:-1])
+        aps.append(float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1])))
+    return float(np.mean(aps))
+
+
+def benchmark_model(model_path, frames, warmup_runs=3):
+    model = YOLOv11Nano(
+        model_path=model_path,
+        confidence_threshold=settings.confidence_threshold,
+        warmup_runs=warmup_runs,
+    )
+    latencies = []
+    detections = []
+    start = time.perf_counter()
+    for frame in frames:
+        t0 = time.perf_counter()
+        result = model.detect(frame)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        detections.append(nms(result))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies)
+    return {
+        "model": model_path,
+        "size_mb": os.path.getsize(model_path) / 1e6,
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_p99": float(np.percentile(latencies, 99)),
+        "throughput_fps": len(frames) / elapsed,
+        "detections_per_frame": float(np.mean([len(d[1]) for d in detections])),
+    }, detections
+
+
+def compare(baseline, candidates, image_dir, max_images=200, json_path=None):
+    frames = [f for f in (cv2.imread(str(p)) for p in list_images(image_dir, max_images)) if f is not None]
+    print(f"Comparing on {len(frames)} frames...")
+
+    baseline_report, reference = benchmark_model(baseline, frames)
+    baseline_report["map50_vs_baseline"] = 1.0
+    reports = [baseline_report]
+    for candidate in candidates:
+        report, detections = benchmark_model(candidate, frames)
+        report["map50_vs_baseline"] = average_precision(reference, detections)
+        report["speedup"] = baseline_report["latency_ms_p50"] / report["latency_ms_p50"]
+        reports.append(report)
+
+    print(f"\n{'model':<45} {'MB':>6} {'p50 ms':>8} {'p95 ms':>8} {'fps':>7} {'mAP50':>7}")
+    for r in reports:
+        map50 = r["map50_vs_baseline"]
+        map50 = f"{map50:.3f}" if map50 is not None else "n/a"
+        print(f"{Path(r['model']).name:<45} {r['size_mb']:>6.1f} {r['latency_ms_p50']:>8.2f} "
+              f"{r['latency_ms_p95']:>8.2f} {r['throughput_fps']:>7.1f} {map50:>7}")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n✓ Report written to {json_path}")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize and compare YOLOv11-nano ONNX variants")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_int8 = sub.add_parser("int8", help="Static INT8 quantization calibrated on sample frames")
+    p_int8.add_argument("--model", default=settings.yolo_model_path)
+    p_int8.add_argument("--output")
+    p_int8.add_argument("--calibration-dir", required=True)
+    p_int8.add_argument("--max-images", type=int, default=200)
+    p_int8.add_argument("--per-channel", action="store_true")
+
+    p_fp16 = sub.add_parser("fp16", help="Convert weights and compute to FP16")
+    p_fp16.add_argument("--model", default=settings.yolo_model_path)
+    p_fp16.add_argument("--output")
+
+    p_cmp = sub.add_parser("compare", help="Latency, throughput and agreement vs the FP32 model")
+    p_cmp.add_argument("--baseline", default=settings.yolo_model_path)
+    p_cmp.add_argument("--candidates", nargs="+", required=True)
+    p_cmp.add_argument("--images", required=True)
+    p_cmp.add_argument("--max-images", type=int, default=200)
+    p_cmp.add_argument("--json")
+
+    args = parser.parse_args()
+    if args.command == "int8":
+        quantize_int8(args.model, args.output or variant_path(args.model, "int8"),
+                      args.calibration_dir, args.max_images, args.per_channel)
+    elif args.command == "fp16":
+        convert_fp16(args.model, args.output or variant_path(args.model, "fp16"))
+    else:
+        compare(args.baseline, args.candidates, args.images, args.max_images, args.json)
+
+
+if __name__ == "__main__":
+    main()
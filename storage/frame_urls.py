@@ -0,0 +1,98 @@
+"""
+Client-facing frame links.
+
+Incidents store direct MinIO URLs. FRAME_URL_MODE controls what clients
+get for them:
+
+- "direct":    the stored URLs, unchanged
+- "presigned": presigned MinIO URLs, for private buckets
+- "proxy":     /frames/{key} links served by the API (backend/frames.py)
+
+Presigned URLs are cached per object and reused until shortly before they
+expire, so list requests don't re-sign every frame, and browsers see a
+stable URL they can cache. Used by the API and by the Celery workers'
+notifications, so this module must not import the web framework or the API
+package. Signing goes through the synchronous MinIO client, so async callers
+sign the missing keys in a worker thread first (unsigned_frame_keys, then
+presigned_urls.sign) and build links with sign=False.
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from event_schema import frame_key
+from lru import LRUCache
+
+
+class PresignedUrlCache:
+    """
+    Presigned GET URLs per object key, kept until shortly before expiry.
+
+    Args:
+        expires_seconds (int): Lifetime of each presigned URL.
+        refresh_margin_seconds (int): Re-sign this long before a URL expires.
+        max_entries (int): Capacity of the LRU.
+    """
+
+    def __init__(self, expires_seconds=3600, refresh_margin_seconds=300, max_entries=10000):
+        self.expires_seconds = expires_seconds
+        self.cache = LRUCache(
+            max_entries=max_entries,
+            ttl_seconds=max(expires_seconds - refresh_margin_seconds, 0)
+        )
+
+    def get(self, key, sign=True):
+        """Presigned URL for key; with sign=False only a cached one, else None."""
+        url = self.cache.get(key)
+        if url is None and sign:
+            from storage.minio_client import get_presigned_url
+            url = get_presigned_url(settings.minio_bucket, key, self.expires_seconds)
+            if url:
+                self.cache.set(key, url)
+        return url
+
+    def sign(self, keys):
+        """Sign and cache keys (blocking)."""
+        for key in keys:
+            self.get(key)
+
+
+presigned_urls = PresignedUrlCache(
+    expires_seconds=settings.frame_presign_expiry_seconds,
+    refresh_margin_seconds=settings.frame_presign_refresh_margin_seconds,
+    max_entries=settings.frame_presign_cache_entries,
+)
+
+
+def unsigned_frame_keys(frame_urls):
+    """Object keys among frame_urls that public_frame_urls would have to sign now."""
+    if settings.frame_url_mode != "presigned":
+        return []
+    keys = (frame_key(url) for url in frame_urls)
+    return list({key for key in keys if "://" not in key and presigned_urls.get(key, sign=False) is None})
+
+
+def public_frame_urls(frame_urls, sign=True):
+    """
+    Rewrite stored frame URLs for clients according to FRAME_URL_MODE.
+
+    With sign=False, presigned mode never calls MinIO: frames without a
+    cached URL keep their stored URL.
+    """
+    mode = settings.frame_url_mode
+    if mode == "direct" or not frame_urls:
+        return frame_urls
+
+    public = []
+    for url in frame_urls:
+        key = frame_key(url)
+        if "://" in key:
+            # Not in the frames bucket; nothing to sign or proxy
+            public.append(url)
+        elif mode == "presigned":
+            public.append(presigned_urls.get(key, sign=sign) or url)
+        else:
+            public.append(f"{settings.frame_proxy_base_url}/frames/{key}")
+    return public
@@ -0,0 +1,20 @@
+from celery import Celery
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+# Producer-only Celery app: tasks are sent by name, so processes that only
+# enqueue work never import the worker module or its database dependencies
+celery_client = Celery('tasks', broker=settings.celery_broker_url)
+celery_client.conf.update(
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],
+)
+
+PROCESS_INCIDENT_TASK = 'tasks.celery_worker.process_incident'
+SEND_TO_LLM_TASK = 'tasks.celery_worker.send_to_llm_service'
+UPDATE_VERIFICATION_TASK = 'tasks.celery_worker.update_verification_status'
+UPDATE_VERIFICATIONS_TASK = 'tasks.celery_worker.update_verification_statuses'
@@ -8,11 +8,19 @@ from datetime import datetime
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
-from database.models import Incident as IncidentModel, async_session, engine
-from sqlalchemy import select, update
-from geoalchemy2.shape import from_shape
-from shapely.geometry import Point
-import requests
+from database.models import Incident as IncidentModel, IncidentHourlyRollup, async_session
+from celery.signals import task_prerun, task_postrun, worker_ready
+import metrics
+import time
+from event_schema import decode_event, encode_event, frame_url
+from tasks.notifications import (
+    publish_new_incident, publish_incident_verified, publish_incidents_verified, publish_incident_merged
+)
+from sqlalchemy import select, update, delete, insert, func, cast, values, column, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from datetime import timedelta
+from geoalchemy2 import Geography
 
 # Initialize Celery app
 celery_app = Celery(
@@ -22,97 +30,248 @@ celery_app = Celery(
 )
 
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
+    # Event payloads are already msgpack bytes; JSON is still accepted for
+    # messages queued by older producers
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],
     result_serializer='json',
+    # Ack only after a task finishes, so a worker crash redelivers it; tasks
+    # are idempotent (upserts keyed on event id), so redelivery is safe
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    broker_transport_options={'visibility_timeout': settings.celery_visibility_timeout_seconds},
     timezone='UTC',
     enable_utc=True,
 )
 
+if settings.stats_use_rollup:
+    # The rollup table only exists once migrations 0002/0003 have run
+    celery_app.conf.beat_schedule = {
+        'refresh-incident-rollup': {
+            'task': 'tasks.celery_worker.refresh_incident_rollup',
+            'schedule': settings.rollup_refresh_seconds,
+        },
+        'rebuild-incident-rollup': {
+            'task': 'tasks.celery_worker.refresh_incident_rollup',
+            'schedule': settings.rollup_full_rebuild_seconds,
+            'kwargs': {'full': True},
+        },
+    }
+
+_task_started = {}
+
+@worker_ready.connect
+def start_worker_metrics(**kwargs):
+    # One exporter per worker; run workers with --pool=solo (as documented) so
+    # all tasks execute in the process that owns it
+    metrics.start_metrics_server(settings.worker_metrics_port)
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and task is not None:
+        metrics.TASK_DURATION.labels(task=task.name, state=state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+def _event_key(event_id):
+    return f"incident_event:{event_id}"
+
+def already_processed(event_id):
+    """Whether an event was already stored; Redis errors fall through to the database."""
+    if settings.event_dedup_ttl_seconds <= 0:
+        return False
+    from tasks.redis_producer import get_redis_client
+    try:
+        return bool(get_redis_client().exists(_event_key(event_id)))
+    except Exception as e:
+        print(f"Event dedup check failed, continuing: {e}")
+        return False
+
+def mark_processed(event_id):
+    if settings.event_dedup_ttl_seconds <= 0:
+        return
+    from tasks.redis_producer import get_redis_client
+    try:
+        get_redis_client().set(_event_key(event_id), 1, ex=settings.event_dedup_ttl_seconds)
+    except Exception as e:
+        print(f"Event dedup marker not set: {e}")
+
+def queue_verification(payload, event):
+    """
+    Queue a newly stored incident for LLM verification.
+
+    Done here rather than in the consumer, so merged events (which have no
+    row of their own) never reach the LLM and results never race the insert.
+    """
+    if not settings.llm_verification_enabled:
+        return
+    from tasks.llm_dispatcher import enqueue_for_verification
+    from tasks.redis_producer import get_redis_client
+    if not isinstance(payload, (bytes, bytearray)):
+        payload = encode_event(event)
+    try:
+        enqueue_for_verification(get_redis_client(), payload)
+    except Exception as e:
+        print(f"Incident {event['id']} not queued for LLM verification: {e}")
+
 @celery_app.task(bind=True, max_retries=3)
 def process_incident(self, event):
     """
     Main task to process an incident event from Redis.
     Stores incident in database.
+    
+    Safe to run more than once for the same event: events already stored
+    are dropped by a Redis marker, and the insert is an upsert keyed on the
+    event id, so retries and broker redeliveries never duplicate incidents.
+    Only newly stored incidents are queued for LLM verification; merged
+    events update an incident that was already queued.
 
     Args:
-        event (dict): The event payload from vision pipeline.
+        event (bytes): The encoded event from the vision pipeline (a legacy
+            JSON dict is also accepted).
     """
+    # A malformed payload fails immediately; retrying would not help
+    payload = event
+    event = decode_event(payload)
+    if already_processed(event['id']):
+        print(f"Incident {event['id']} already processed, skipping")
+        return {"status": "duplicate", "incident_id": event['id']}
     try:
         print(f"Processing incident: {event['id']}")
         
         # Run async database operation
-        asyncio.run(store_incident_in_db(event))
-        
-        print(f"Incident {event['id']} stored in database")
-        return {"status": "success", "incident_id": event['id']}
-    
+        outcome, incident_id = asyncio.run(store_incident_in_db(event))
+    except IntegrityError as exc:
+        # Constraint violations fail the same way every time
+        print(f"Incident {event['id']} rejected by the database: {exc.orig}")
+        raise
     except Exception as exc:
         print(f"Error processing incident: {exc}")
         raise self.retry(exc=exc, countdown=60)
+    
+    mark_processed(event['id'])
+    if outcome == "merged":
+        print(f"Incident {event['id']} merged into {incident_id}")
+        publish_incident_merged(incident_id, event)
+        return {"status": "merged", "incident_id": event['id'], "merged_into": incident_id}
+    if outcome == "exists":
+        print(f"Incident {event['id']} already stored")
+        return {"status": "duplicate", "incident_id": event['id']}
+    
+    print(f"Incident {event['id']} stored in database")
+    publish_new_incident(event)
+    queue_verification(payload, event)
+    return {"status": "success", "incident_id": event['id']}
+
+async def find_duplicate_incident(session, event, point, timestamp):
+    """
+    Find a stored incident of the same type near the event in space and time.
+    
+    Returns:
+        Incident: The most recent matching incident (row-locked), or None.
+    """
+    window = timedelta(seconds=settings.dedup_window_seconds)
+    # Compare as geography so the radius is in metres
+    distance_ok = func.ST_DWithin(
+        cast(func.ST_SetSRID(IncidentModel.location, 4326), Geography),
+        cast(point, Geography),
+        settings.dedup_radius_m
+    )
+    result = await session.execute(
+        select(IncidentModel)
+        .where(
+            IncidentModel.incident_type == event['incident'],
+            IncidentModel.timestamp.between(timestamp - window, timestamp + window),
+            distance_ok
+        )
+        .order_by(IncidentModel.timestamp.desc())
+        .limit(1)
+        .with_for_update()
+    )
+    return result.scalar_one_or_none()
 
 async def store_incident_in_db(event):
     """
-    Store incident in PostgreSQL database.
+    Store incident in PostgreSQL database, merging it into a recent duplicate.
     
     Args:
-        event (dict): The event payload.
+        event (dict): The decoded event payload.
+    
+    Returns:
+        tuple: (outcome, incident_id) with outcome "inserted", "merged" (incident_id
+            is the incident merged into) or "exists" (stored by an earlier attempt).
     """
     async with async_session() as session:
-        # Create PostGIS point
-        point = from_shape(
-            Point(event['location']['lon'], event['location']['lat']), 
-            srid=4326
+        # Create PostGIS point in SQL, no shapely round trip
+        point = func.ST_SetSRID(
+            func.ST_MakePoint(event['location']['lon'], event['location']['lat']),
+            4326
         )
+        timestamp = event['timestamp']
+        frame_urls = [frame_url(key) for key in event['frames']]
         
-        # Create incident
-        incident = IncidentModel(
-            id=event['id'],
-            incident_type=event['incident'],
-            confidence=event['confidence'],
-            timestamp=datetime.fromisoformat(event['timestamp']),
-            frame_urls=event['frames'],
-            verification_status='pending',
-            location=point
-        )
+        # Stored by an earlier attempt of this task: nothing to insert or merge
+        stored = await session.execute(select(IncidentModel.id).where(IncidentModel.id == event['id']))
+        if stored.scalar_one_or_none() is not None:
+            return "exists", event['id']
+        
+        if settings.dedup_enabled:
+            duplicate = await find_duplicate_incident(session, event, point, timestamp)
+            if duplicate is not None:
+                duplicate.confidence = max(duplicate.confidence, event['confidence'])
+                # Skip frames already merged, so merging the same event again is a no-op
+                existing = list(duplicate.frame_urls)
+                new_urls = [url for url in frame_urls if url not in existing]
+                duplicate.frame_urls = (existing + new_urls)[-settings.dedup_max_frames:]
+                with metrics.DB_COMMIT_LATENCY.labels(operation='merge_incident').time():
+                    await session.commit()
+                return "merged", duplicate.id
         
-        session.add(incident)
-        await session.commit()
+        # INSERT ... ON CONFLICT (id) DO NOTHING, so a retry after a commit
+        # that succeeded is not a primary-key error
+        result = await session.execute(
+            pg_insert(IncidentModel)
+            .values(
+                id=event['id'],
+                incident_type=event['incident'],
+                confidence=event['confidence'],
+                timestamp=timestamp,
+                frame_urls=frame_urls,
+                verification_status='pending',
+                location=point
+            )
+            .on_conflict_do_nothing(index_elements=[IncidentModel.id])
+            .returning(IncidentModel.id)
+        )
+        inserted = result.scalar_one_or_none()
+        with metrics.DB_COMMIT_LATENCY.labels(operation='store_incident').time():
+            await session.commit()
+        return ("inserted" if inserted is not None else "exists"), event['id']
 
-@celery_app.task(bind=True, max_retries=3)
-def send_to_llm_service(self, event):
+@celery_app.task
+def send_to_llm_service(event):
     """
-    Task to send event to the LLM verification microservice.
+    Task to queue an event for LLM verification.
+
+    The HTTP call is made by tasks/llm_dispatcher.py, which batches requests
+    and limits concurrency, so no worker slot waits on the LLM service.
 
     Args:
-        event (dict): The event payload to send.
+        event (bytes): The encoded event payload.
     """
-    try:
-        # Placeholder for LLM service endpoint
-        llm_service_url = "http://localhost:8001/verify"
-        
-        print(f"Sending event {event['id']} to LLM service")
-        
-        # Send POST request to LLM service
-        response = requests.post(
-            llm_service_url,
-            json=event,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            print(f"Event {event['id']} sent to LLM successfully")
-            return {"status": "success", "response": response.json()}
-        else:
-            raise Exception(f"LLM service returned status {response.status_code}")
-    
-    except requests.exceptions.RequestException as exc:
-        print(f"Error sending to LLM service: {exc}")
-        # Don't retry if LLM service is down, just log
-        return {"status": "failed", "error": str(exc)}
-    except Exception as exc:
-        print(f"Unexpected error: {exc}")
-        raise self.retry(exc=exc, countdown=120)
+    from tasks.llm_dispatcher import enqueue_for_verification
+    from tasks.redis_producer import get_redis_client
+    
+    event_id = decode_event(event)['id']
+    enqueue_for_verification(get_redis_client(), event)
+    print(f"Event {event_id} queued for LLM verification")
+    return {"status": "queued", "incident_id": event_id}
 
 @celery_app.task(bind=True, max_retries=3)
 def update_verification_status(self, incident_id, status, verified_by="llm"):
@@ -131,32 +290,96 @@ def update_verification_status(self, incident_id, status, verified_by="llm"):
         asyncio.run(update_incident_status(incident_id, status))
         
         print(f"Incident {incident_id} status updated to {status}")
+        publish_incident_verified(incident_id, status)
         return {"status": "success", "incident_id": incident_id, "new_status": status}
     
     except Exception as exc:
         print(f"Error updating incident status: {exc}")
         raise self.retry(exc=exc, countdown=60)
 
+@celery_app.task(bind=True, max_retries=3)
+def update_verification_statuses(self, updates):
+    """
+    Task to apply many verification results at once.
+    
+    Incidents not found yet (e.g. still being stored) are retried on their own.
+    
+    Args:
+        updates (list): [incident_id, status] pairs.
+    """
+    try:
+        updated = asyncio.run(update_incident_statuses(updates))
+    except Exception as exc:
+        print(f"Error updating incident statuses: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+    
+    statuses = dict(updates)
+    updated_set = set(updated)
+    if updated:
+        publish_incidents_verified([(incident_id, statuses[incident_id]) for incident_id in updated])
+    print(f"Updated verification status of {len(updated)} incident(s)")
+    
+    missing = [[incident_id, status] for incident_id, status in statuses.items() if incident_id not in updated_set]
+    if missing and self.request.retries < self.max_retries:
+        print(f"{len(missing)} incident(s) not found yet, retrying")
+        raise self.retry(args=[missing], countdown=60)
+    return {"status": "success", "updated": len(updated), "missing": [m[0] for m in missing]}
+
 async def update_incident_status(incident_id, status):
     """
     Update incident verification status in database.
     
+    A single UPDATE ... RETURNING; the row (geometry, frame URLs) is never loaded.
+    
     Args:
         incident_id (str): The incident ID.
         status (str): The new status.
     """
     async with async_session() as session:
         result = await session.execute(
-            select(IncidentModel).where(IncidentModel.id == incident_id)
+            update(IncidentModel)
+            .where(IncidentModel.id == incident_id)
+            .values(verification_status=status)
+            .returning(IncidentModel.id)
+            .execution_options(synchronize_session=False)
         )
-        incident = result.scalar_one_or_none()
-        
-        if incident:
-            incident.verification_status = status
+        updated = result.scalar_one_or_none()
+        with metrics.DB_COMMIT_LATENCY.labels(operation='update_status').time():
             await session.commit()
-        else:
+        
+        if updated is None:
             raise ValueError(f"Incident {incident_id} not found")
 
+async def update_incident_statuses(updates):
+    """
+    Update the verification status of many incidents in one statement.
+    
+    Args:
+        updates (list): (incident_id, status) pairs; the last status wins for repeated ids.
+    
+    Returns:
+        list: IDs of the incidents that were updated.
+    """
+    statuses = dict(updates)
+    if not statuses:
+        return []
+    # UPDATE incidents SET ... FROM (VALUES ...) AS v(id, status) WHERE incidents.id = v.id
+    new_values = values(
+        column('id', String), column('status', String), name='new_status'
+    ).data(list(statuses.items()))
+    async with async_session() as session:
+        result = await session.execute(
+            update(IncidentModel)
+            .where(IncidentModel.id == new_values.c.id)
+            .values(verification_status=new_values.c.status)
+            .returning(IncidentModel.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated = list(result.scalars().all())
+        with metrics.DB_COMMIT_LATENCY.labels(operation='update_statuses').time():
+            await session.commit()
+    return updated
+
 @celery_app.task
 def cleanup_old_incidents(days_old=30):
     """
@@ -167,4 +390,65 @@ def cleanup_old_incidents(days_old=30):
     """
     print(f"Cleaning up incidents older than {days_old} days")
     # Implementation for cleanup
-    return {"status": "success", "message": f"Cleaned up incidents older than {days_old} days"}
\ No newline at end of file
+    return {"status": "success", "message": f"Cleaned up incidents older than {days_old} days"}
+
+@celery_app.task
+def refresh_incident_rollup(lookback_hours=None, full=False):
+    """
+    Periodic task to refresh the hourly incident counts used by /incidents/stats.
+    
+    Args:
+        lookback_hours (int): Hours of row changes to pick up (default from settings).
+        full (bool): Rebuild every bucket instead of only the changed ones.
+    """
+    lookback_hours = lookback_hours or settings.rollup_lookback_hours
+    rows = asyncio.run(refresh_rollup_in_db(lookback_hours, full=full))
+    return {"status": "success", "full": full, "rows": rows}
+
+# Serializes refreshes, so overlapping runs never insert the same bucket twice
+ROLLUP_LOCK_ID = 4210001
+
+async def refresh_rollup_in_db(lookback_hours, full=False):
+    """
+    Rebuild rollup rows in one transaction.
+    
+    Incremental refreshes rebuild every hour that holds a row inserted or
+    updated (updated_at) within the lookback, so late or replayed rows and
+    status changes to old incidents are counted wherever they fall in time.
+    A full rebuild also catches deleted rows.
+    
+    Args:
+        lookback_hours (int): Hours of row changes to pick up.
+        full (bool): Rebuild all buckets.
+    
+    Returns:
+        int: Rollup rows written, one per (hour, type, status).
+    """
+    bucket = func.date_trunc('hour', IncidentModel.timestamp)
+    status = func.coalesce(IncidentModel.verification_status, 'pending').label('verification_status')
+    counts = select(bucket.label('bucket'), IncidentModel.incident_type, status, func.count().label('count'))
+    stale = delete(IncidentHourlyRollup)
+    changed = None
+    if not full:
+        changed = (
+            select(bucket.label('bucket'))
+            .where(IncidentModel.updated_at >= func.now() - timedelta(hours=lookback_hours))
+            .distinct()
+            .scalar_subquery()
+        )
+        counts = counts.where(bucket.in_(changed))
+        stale = stale.where(IncidentHourlyRollup.bucket.in_(changed))
+    counts = counts.group_by(bucket, IncidentModel.incident_type, status)
+    
+    async with async_session() as session:
+        with metrics.DB_COMMIT_LATENCY.labels(operation='refresh_rollup').time():
+            async with session.begin():
+                await session.execute(select(func.pg_advisory_xact_lock(ROLLUP_LOCK_ID)))
+                await session.execute(stale)
+                inserted = await session.execute(
+                    insert(IncidentHourlyRollup).from_select(
+                        ['bucket', 'incident_type', 'verification_status', 'count'],
+                        counts
+                    )
+                )
+    return inserted.rowcount
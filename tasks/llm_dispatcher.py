@@ -0,0 +1,358 @@
+"""
+Async LLM verification dispatcher.
+
+Events queued for verification (a Redis list, filled by the Celery worker
+once an incident is stored) are sent to the LLM service from a single asyncio
+process instead of occupying Celery worker slots for the length of each HTTP
+call:
+
+- one pooled HTTP client, with at most llm_max_concurrency requests in flight,
+- micro-batching into POST /verify/batch when the service supports it,
+- a circuit breaker that stops pulling work while the service is failing;
+  events that hit a server error are put back on the queue, and after
+  llm_max_attempts failed calls moved to a dead-letter list instead,
+- results are written through the update_verification_statuses Celery
+  task, one batched UPDATE per response, from a worker thread; if that
+  fails the events are put back on the queue.
+
+Service contract:
+    POST /verify        <event JSON>              -> {"id": ..., "status": ...}
+    POST /verify/batch  {"events": [<event>...]}  -> {"results": [{"id": ..., "status": ...}]}
+
+Run:
+    python tasks/llm_dispatcher.py
+"""
+import asyncio
+import time
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from event_schema import decode_event, event_to_dict
+import metrics
+
+
+def enqueue_for_verification(redis_client, payload):
+    """
+    Queue an encoded event for verification.
+
+    Args:
+        redis_client: Synchronous Redis client.
+        payload (bytes): The encoded event, forwarded unchanged.
+    """
+    redis_client.rpush(settings.llm_queue_key, payload)
+
+
+class ServiceError(Exception):
+    """The LLM service failed in a way worth retrying (5xx, timeout, connection)."""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service and probes it again after a cool-down.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_seconds (float): Time the circuit stays open before a trial call.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Whether a call may be made now; in half-open state only one trial is allowed."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print("LLM service recovered; closing circuit")
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        metrics.LLM_BREAKER_OPEN.set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(f"LLM service failing ({self.failures} consecutive errors); "
+                      f"opening circuit for {self.reset_seconds:.0f}s")
+            self.opened_at = time.monotonic()
+            metrics.LLM_BREAKER_OPEN.set(1)
+
+
+class VerificationDispatcher:
+    """
+    Pulls queued events from Redis and verifies them with the LLM service.
+
+    Args:
+        redis_client: redis.asyncio client holding the verification queue.
+        http_client (httpx.AsyncClient): Pooled client for the LLM service.
+        write_results (callable): Called with [(incident_id, status), ...] in
+            the default executor; may block.
+        batch_size (int): Events per request; 1 disables batching.
+        batch_wait_ms (int): Time to wait for a batch to fill.
+        max_concurrency (int): Requests in flight.
+        breaker (CircuitBreaker): Breaker guarding the service.
+        queue_key (str): Redis list of queued events.
+        max_attempts (int): Failed calls an event may be part of before it is
+            dead-lettered, so one event the service always fails on can't
+            keep the breaker tripping and the queue busy.
+        dead_letter_key (str): Redis list for events given up on.
+    """
+
+    def __init__(self, redis_client, http_client, write_results, batch_size=16, batch_wait_ms=50,
+                 max_concurrency=8, breaker=None, queue_key="llm_verify", max_attempts=5,
+                 dead_letter_key="llm_verify:dead"):
+        self.redis = redis_client
+        self.http = http_client
+        self.write_results = write_results
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self.queue_key = queue_key
+        # Failed attempts per event id; kept in Redis so restarts don't reset them
+        self.attempts_key = f"{queue_key}:attempts"
+        self.max_attempts = max(1, max_attempts)
+        self.dead_letter_key = dead_letter_key
+        self.breaker = breaker or CircuitBreaker()
+        self.max_concurrency = max_concurrency
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = set()
+
+    async def _next_batch(self):
+        """Block for the first event, then collect more until the batch is full or the wait ends."""
+        item = await self.redis.blpop(self.queue_key, timeout=1)
+        if item is None:
+            return []
+        batch = [item[1]]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            more = await self.redis.lpop(self.queue_key, self.batch_size - len(batch))
+            if more:
+                batch.extend(more)
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            item = await self.redis.blpop(self.queue_key, timeout=max(remaining, 0.01))
+            if item is None:
+                break
+            batch.append(item[1])
+        return batch
+
+    async def _post(self, path, body):
+        start = time.perf_counter()
+        try:
+            response = await self.http.post(path, json=body)
+        except Exception as e:
+            metrics.LLM_REQUESTS.labels(result="error").inc()
+            raise ServiceError(f"{type(e).__name__}: {e}") from e
+        finally:
+            metrics.LLM_LATENCY.observe(time.perf_counter() - start)
+        if response.status_code >= 500:
+            metrics.LLM_REQUESTS.labels(result="server_error").inc()
+            raise ServiceError(f"LLM service returned {response.status_code}")
+        if response.status_code >= 400:
+            # The request itself is bad; retrying the same events would not help
+            metrics.LLM_REQUESTS.labels(result="rejected").inc()
+            print(f"LLM service rejected request ({response.status_code}): {response.text[:200]}")
+            return None
+        try:
+            body = response.json()
+        except ValueError as e:
+            metrics.LLM_REQUESTS.labels(result="server_error").inc()
+            raise ServiceError(f"Invalid JSON from LLM service: {e}") from e
+        metrics.LLM_REQUESTS.labels(result="success").inc()
+        return body
+
+    async def _verify(self, payloads):
+        events = []
+        for payload in payloads:
+            try:
+                events.append(event_to_dict(decode_event(payload)))
+            except ValueError as e:
+                print(f"Dropping undecodable event: {e}")
+        if not events:
+            return []
+
+        if len(events) == 1:
+            result = await self._post("/verify", events[0])
+            results = [result] if result else []
+        else:
+            result = await self._post("/verify/batch", {"events": events})
+            results = (result.get("results") if isinstance(result, dict) else None) or []
+        return [
+            (r["id"], r["status"]) for r in results
+            if isinstance(r, dict) and r.get("id") and r.get("status")
+        ]
+
+    async def _requeue_failed(self, payloads):
+        """
+        Put events back after a failed call, counting the attempt.
+
+        Events failing for the first time go back to the head of the queue
+        so they are retried first; repeat failures go to the tail, so they
+        are batched with other events instead of holding up the head; events
+        out of attempts go to the dead-letter list.
+        """
+        retry_first, retry_later = [], []
+        for payload in payloads:
+            try:
+                event_id = decode_event(payload)['id']
+            except ValueError:
+                continue
+            attempts = await self.redis.hincrby(self.attempts_key, event_id, 1)
+            if attempts >= self.max_attempts:
+                print(f"Giving up on LLM verification of {event_id} after {attempts} failed attempts")
+                metrics.LLM_DEAD_LETTERED.inc()
+                await self.redis.rpush(self.dead_letter_key, payload)
+                await self.redis.hdel(self.attempts_key, event_id)
+            elif attempts == 1:
+                retry_first.append(payload)
+            else:
+                retry_later.append(payload)
+        if retry_first:
+            await self.redis.lpush(self.queue_key, *reversed(retry_first))
+        if retry_later:
+            await self.redis.rpush(self.queue_key, *retry_later)
+
+    async def _clear_attempts(self, payloads):
+        event_ids = []
+        for payload in payloads:
+            try:
+                event_ids.append(decode_event(payload)['id'])
+            except ValueError:
+                pass
+        if event_ids:
+            await self.redis.hdel(self.attempts_key, *event_ids)
+
+    async def _dispatch(self, payloads):
+        try:
+            results = await self._verify(payloads)
+        except ServiceError as e:
+            self.breaker.record_failure()
+            print(f"LLM verification failed for {len(payloads)} event(s), requeueing: {e}")
+            await self._requeue_failed(payloads)
+        except asyncio.CancelledError:
+            # Shutting down mid-request; leave the events for the next run
+            await self.redis.lpush(self.queue_key, *reversed(payloads))
+            raise
+        else:
+            self.breaker.record_success()
+            await self._clear_attempts(payloads)
+            if results:
+                await self._write(results, payloads)
+        finally:
+            self.slots.release()
+
+    async def _write(self, results, payloads):
+        """Hand results to write_results off the event loop; requeue the events if that fails."""
+        loop = asyncio.get_running_loop()
+        try:
+            # write_results talks to the broker synchronously
+            await loop.run_in_executor(None, self.write_results, results)
+        except Exception as e:
+            print(f"Could not record {len(results)} verification result(s), requeueing: {e}")
+            await self.redis.lpush(self.queue_key, *reversed(payloads))
+
+    async def run(self):
+        print(f"LLM dispatcher started: {settings.llm_service_url} "
+              f"(batch {self.batch_size}, concurrency {self.max_concurrency})")
+        try:
+            while True:
+                if not self.breaker.allow():
+                    await asyncio.sleep(max(self.breaker.retry_after(), 0.1))
+                    continue
+                # Take a slot before pulling work, so nothing is held in memory
+                # beyond what is actually being sent
+                await self.slots.acquire()
+                try:
+                    batch = await self._next_batch()
+                except BaseException:
+                    self.slots.release()
+                    raise
+                if not batch:
+                    self.slots.release()
+                    # Nothing was sent, so a half-open trial is still available
+                    self.breaker.trial_in_flight = False
+                    continue
+                task = asyncio.create_task(self._dispatch(batch))
+                self.in_flight.add(task)
+                task.add_done_callback(self.in_flight.discard)
+        finally:
+            if self.in_flight:
+                await asyncio.gather(*self.in_flight, return_exceptions=True)
+
+
+def write_results_via_celery(results):
+    """Record a batch of verification results with one update_verification_statuses task."""
+    from tasks.celery_client import celery_client, UPDATE_VERIFICATIONS_TASK
+    celery_client.send_task(UPDATE_VERIFICATIONS_TASK, args=[[list(r) for r in results]])
+    print(f"✓ Queued {len(results)} verification result(s)")
+
+
+async def main():
+    import httpx
+    import redis.asyncio as aioredis
+
+    redis_client = aioredis.Redis(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db)
+    batch_size = settings.llm_batch_size if settings.llm_supports_batch else 1
+    async with httpx.AsyncClient(
+        base_url=settings.llm_service_url,
+        timeout=settings.llm_timeout_seconds,
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_concurrency,
+            max_keepalive_connections=settings.llm_max_concurrency
+        ),
+    ) as http_client:
+        dispatcher = VerificationDispatcher(
+            redis_client,
+            http_client,
+            write_results_via_celery,
+            batch_size=batch_size,
+            batch_wait_ms=settings.llm_batch_wait_ms,
+            max_concurrency=settings.llm_max_concurrency,
+            breaker=CircuitBreaker(settings.llm_breaker_failure_threshold, settings.llm_breaker_reset_seconds),
+            queue_key=settings.llm_queue_key,
+            max_attempts=settings.llm_max_attempts,
+            dead_letter_key=settings.llm_dead_letter_key,
+        )
+        try:
+            await dispatcher.run()
+        finally:
+            await redis_client.close()
+
+
+if __name__ == "__main__":
+    metrics.start_metrics_server(settings.llm_dispatcher_metrics_port)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nShutting down LLM dispatcher...")
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the LLM verification service.
+
+Implements the contract expected by tasks/llm_dispatcher.py with a
+configurable delay and failure rate, for exercising batching, concurrency
+limits and the circuit breaker without a real model.
+
+Usage:
+    python tasks/llm_stub_server.py --port 8001 --latency-ms 800 --failure-rate 0.1
+"""
+import argparse
+import asyncio
+import random
+
+from fastapi import FastAPI, HTTPException, Request
+
+app = FastAPI(title="LLM verification stub")
+app.state.latency_ms = 500.0
+app.state.failure_rate = 0.0
+app.state.reject_below = 0.6
+app.state.in_flight = 0
+app.state.max_in_flight = 0
+app.state.requests = 0
+
+
+def verdict(event):
+    status = "verified" if event.get("confidence", 0.0) >= app.state.reject_below else "rejected"
+    return {"id": event.get("id"), "status": status}
+
+
+async def simulate_call():
+    app.state.requests += 1
+    app.state.in_flight += 1
+    app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+    try:
+        await asyncio.sleep(app.state.latency_ms / 1000)
+        if random.random() < app.state.failure_rate:
+            raise HTTPException(status_code=503, detail="Simulated failure")
+    finally:
+        app.state.in_flight -= 1
+
+
+@app.post("/verify")
+async def verify(request: Request):
+    event = await request.json()
+    await simulate_call()
+    return verdict(event)
+
+
+@app.post("/verify/batch")
+async def verify_batch(request: Request):
+    body = await request.json()
+    events = body.get("events") or []
+    await simulate_call()
+    return {"results": [verdict(event) for event in events]}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "requests": app.state.requests,
+        "in_flight": app.state.in_flight,
+        "max_in_flight": app.state.max_in_flight,
+    }
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="LLM verification stub service")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--reject-below", type=float, default=0.6, help="Confidence below which events are rejected")
+    args = parser.parse_args()
+
+    app.state.latency_ms = args.latency_ms
+    app.state.failure_rate = args.failure_rate
+    app.state.reject_below = args.reject_below
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+End-to-end ingest load generator.
+
+Publishes synthetic incident events at a fixed rate through the real path
+(Redis 'events' channel -> redis_consumer -> Celery -> Postgres) and measures:
+
+- sustained throughput (events/sec committed),
+- end-to-end latency from publish to DB commit, taken from the post-commit
+  notifications the workers publish on the WebSocket fan-out channel,
+- Celery queue backlog over time.
+
+The consumer and a solo Celery worker can be started as local subprocesses
+with --spawn-consumer / --spawn-worker; Redis and Postgres must be running.
+
+Each camera sits at a fixed location, so repeated events of one type are
+merged by spatial dedup like real ones; --unique-locations scatters every
+event instead, to measure raw insert throughput. Load rows are tagged with
+"load_<run>_" ids and "load-<run>-" camera ids; --cleanup deletes the run's
+rows afterwards and --cleanup-all deletes every load row and exits.
+
+Usage:
+    python tasks/load_generator.py --rate 50 --cameras 20 --duration 60 --spawn-consumer --spawn-worker
+    python tasks/load_generator.py --rate 200 --unique-locations --cleanup --spawn-consumer --spawn-worker
+    python tasks/load_generator.py --cleanup-all
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import redis
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from tasks.redis_producer import publish_event
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every load row's id starts with this, followed by the run id
+LOAD_ID_PREFIX = "load_"
+# Spread of --unique-locations around a camera (degrees, ~55 km), wide
+# enough that two events landing within the dedup radius is rare
+UNIQUE_LOCATION_SPREAD = 0.5
+
+# Relative frequency of synthetic incident types
+INCIDENT_MIX = {
+    "traffic_congestion": 0.45,
+    "person_detected": 0.35,
+    "accident": 0.1,
+    "fire": 0.05,
+    "garbage": 0.05,
+}
+
+
+class CameraSimulator:
+    """
+    Synthesizes events for one camera at a fixed location.
+
+    Args:
+        name (str): Camera name within the run, e.g. "cam3".
+        run_id (str): Load run the events belong to.
+        rng (random.Random): Source of randomness.
+        unique_locations (bool): Scatter each event around the camera so
+            dedup doesn't merge them.
+    """
+
+    def __init__(self, name, run_id, rng, unique_locations=False):
+        self.name = name
+        self.camera_id = f"load-{run_id}-{name}"
+        self.run_id = run_id
+        self.rng = rng
+        self.unique_locations = unique_locations
+        # Spread cameras ~1-5 km around the default location
+        self.lat = settings.default_lat + rng.uniform(-0.05, 0.05)
+        self.lon = settings.default_lon + rng.uniform(-0.05, 0.05)
+        self.sequence = 0
+
+    def next_location(self):
+        if not self.unique_locations:
+            return {"lat": self.lat, "lon": self.lon}
+        return {
+            "lat": self.lat + self.rng.uniform(-UNIQUE_LOCATION_SPREAD, UNIQUE_LOCATION_SPREAD),
+            "lon": self.lon + self.rng.uniform(-UNIQUE_LOCATION_SPREAD, UNIQUE_LOCATION_SPREAD),
+        }
+
+    def next_event(self):
+        self.sequence += 1
+        incident_id = f"{LOAD_ID_PREFIX}{self.run_id}_{self.name}_{self.sequence}"
+        incident_type = self.rng.choices(list(INCIDENT_MIX), weights=list(INCIDENT_MIX.values()))[0]
+        return {
+            "id": incident_id,
+            "incident": incident_type,
+            "confidence": round(self.rng.uniform(0.5, 0.99), 3),
+            "frames": [f"{incident_id}_f{i}.jpg" for i in range(1, settings.frames_to_extract + 1)],
+            "timestamp": datetime.now(timezone.utc),
+            "location": self.next_location(),
+            "camera_id": self.camera_id,
+        }
+
+
+class CommitListener(threading.Thread):
+    """Records when each published event is reported as committed by a worker."""
+
+    def __init__(self, prefix):
+        super().__init__(daemon=True)
+        self.prefix = prefix
+        self.committed = {}
+        self.merged = 0
+        self._client = redis.StrictRedis.from_url(settings.ws_fanout_redis_url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(settings.ws_fanout_channel)
+        self._stop = threading.Event()
+
+    def run(self):
+        while not self._stop.is_set():
+            message = self._pubsub.get_message(timeout=0.5)
+            if not message:
+                continue
+            received = time.time()
+            try:
+                payload = json.loads(message["data"])
+            except (ValueError, TypeError):
+                continue
+            data = payload.get("data") or {}
+            if payload.get("type") == "new_incident":
+                incident_id = data.get("id")
+            elif payload.get("type") == "incident_merged":
+                incident_id = data.get("merged_id")
+                if incident_id and incident_id.startswith(self.prefix):
+                    self.merged += 1
+            else:
+                continue
+            if incident_id and incident_id.startswith(self.prefix):
+                self.committed.setdefault(incident_id, received)
+
+    def stop(self):
+        self._stop.set()
+        self.join(timeout=2)
+        self._pubsub.close()
+
+
+def queue_depth(client, queue_name="celery"):
+    try:
+        return client.llen(queue_name)
+    except redis.RedisError:
+        return None
+
+
+def spawn_local_services(consumer, worker):
+    processes = []
+    if worker:
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "celery", "-A", "tasks.celery_worker", "worker",
+             "--pool=solo", "--loglevel=warning"],
+            cwd=PROJECT_ROOT
+        ))
+    if consumer:
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join("tasks", "redis_consumer.py")],
+            cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL
+        ))
+    if processes:
+        # Give the subscribers time to connect before the first publish
+        time.sleep(5)
+    return processes
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def delete_load_rows_statement(prefix):
+    """DELETE for incidents whose id starts with prefix, taken literally."""
+    from sqlalchemy import delete
+    from database.models import Incident
+    # "_" and "%" in the prefix are LIKE wildcards unless escaped
+    return delete(Incident).where(Incident.id.startswith(prefix, autoescape=True))
+
+
+async def delete_load_rows(prefix):
+    """
+    Delete incidents whose id starts with prefix and rebuild the stats rollup,
+    which doesn't see deleted rows on its incremental refreshes.
+
+    Returns:
+        int: Rows deleted.
+    """
+    from database.models import async_session
+    from tasks.celery_worker import refresh_rollup_in_db
+
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(delete_load_rows_statement(prefix))
+    if result.rowcount and settings.stats_use_rollup:
+        await refresh_rollup_in_db(None, full=True)
+    return result.rowcount
+
+
+def cleanup(prefix):
+    deleted = asyncio.run(delete_load_rows(prefix))
+    print(f"✓ Deleted {deleted} load incident(s) with ids starting {prefix!r}")
+
+
+def run_load(rate, cameras, duration, drain_timeout, seed=None, unique_locations=False):
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex[:8]
+    prefix = f"{LOAD_ID_PREFIX}{run_id}_"
+    simulators = [CameraSimulator(f"cam{i}", run_id, rng, unique_locations) for i in range(cameras)]
+    broker = redis.StrictRedis.from_url(settings.celery_broker_url)
+
+    listener = CommitListener(prefix)
+    listener.start()
+
+    published = {}
+    backlog = []
+    interval = 1.0 / rate
+    start = time.time()
+    next_send = start
+    next_sample = start
+    print(f"Publishing {rate} events/s from {cameras} cameras for {duration}s (run {run_id})")
+
+    while time.time() - start < duration:
+        now = time.time()
+        if now >= next_sample:
+            backlog.append((now - start, queue_depth(broker)))
+            next_sample += 1.0
+        if now < next_send:
+            time.sleep(min(next_send - now, 0.01))
+            continue
+        event = simulators[len(published) % cameras].next_event()
+        published[event["id"]] = time.time()
+        publish_event(event)
+        next_send += interval
+
+    publish_end = time.time()
+    print(f"Published {len(published)} events; waiting up to {drain_timeout}s for commits...")
+    while time.time() - publish_end < drain_timeout and len(listener.committed) < len(published):
+        backlog.append((time.time() - start, queue_depth(broker)))
+        time.sleep(1.0)
+    listener.stop()
+
+    latencies = [
+        (listener.committed[i] - published[i]) * 1000 for i in published if i in listener.committed
+    ]
+    in_window = [i for i in published if listener.committed.get(i, float("inf")) <= publish_end]
+    depths = [d for _, d in backlog if d is not None]
+    during = [(t, d) for t, d in backlog if d is not None and t <= duration]
+    growth = (during[-1][1] - during[0][1]) / max(during[-1][0] - during[0][0], 1e-9) if len(during) > 1 else 0.0
+
+    return {
+        "run_id": run_id,
+        "id_prefix": prefix,
+        "target_rate": rate,
+        "cameras": cameras,
+        "unique_locations": unique_locations,
+        "duration_s": duration,
+        "published": len(published),
+        "committed": len(listener.committed),
+        "merged_by_dedup": listener.merged,
+        "lost_or_pending": len(published) - len(listener.committed),
+        "publish_rate": len(published) / (publish_end - start),
+        "sustained_commit_rate": len(in_window) / (publish_end - start),
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "backlog": {
+            "max": max(depths) if depths else None,
+            "final": depths[-1] if depths else None,
+            "growth_per_s": growth,
+        },
+    }
+
+
+def print_report(report):
+    lat = report["latency_ms"]
+    fmt = lambda v: f"{v:.0f}" if v is not None else "n/a"
+    print(f"\n{'='*60}")
+    print(f"Published:        {report['published']} ({report['publish_rate']:.1f}/s)")
+    print(f"Committed:        {report['committed']} (merged by dedup: {report['merged_by_dedup']})")
+    print(f"Sustained commit: {report['sustained_commit_rate']:.1f} events/s")
+    print(f"Latency ms:       p50 {fmt(lat['p50'])}  p95 {fmt(lat['p95'])}  "
+          f"p99 {fmt(lat['p99'])}  max {fmt(lat['max'])}")
+    print(f"Celery backlog:   max {report['backlog']['max']}  final {report['backlog']['final']}  "
+          f"growth {report['backlog']['growth_per_s']:+.1f}/s")
+    if report["backlog"]["growth_per_s"] > 0.5:
+        print("⚠ Backlog grew during the run: target rate is above ingest capacity")
+    print(f"{'='*60}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest path load generator")
+    parser.add_argument("--rate", type=float, default=20.0, help="Events per second")
+    parser.add_argument("--cameras", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to publish for")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--spawn-consumer", action="store_true", help="Start tasks/redis_consumer.py locally")
+    parser.add_argument("--spawn-worker", action="store_true", help="Start a solo Celery worker locally")
+    parser.add_argument("--unique-locations", action="store_true",
+                        help="Scatter every event so spatial dedup doesn't merge them")
+    parser.add_argument("--cleanup", action="store_true", help="Delete this run's incidents afterwards")
+    parser.add_argument("--cleanup-all", action="store_true",
+                        help=f"Delete every incident with a {LOAD_ID_PREFIX!r} id and exit")
+    parser.add_argument("--json", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.cleanup_all:
+        cleanup(LOAD_ID_PREFIX)
+        return
+
+    if not (settings.ws_fanout_enabled and settings.incident_notify_enabled):
+        raise SystemExit("Latency is measured from worker commit notifications; "
+                         "enable WS_FANOUT_ENABLED and INCIDENT_NOTIFY_ENABLED")
+
+    processes = spawn_local_services(args.spawn_consumer, args.spawn_worker)
+    try:
+        report = run_load(
+            args.rate, args.cameras, args.duration, args.drain_timeout, args.seed, args.unique_locations
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report written to {args.json}")
+    if args.cleanup:
+        cleanup(report["id_prefix"])
+
+
+if __name__ == "__main__":
+    main()
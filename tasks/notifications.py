@@ -0,0 +1,104 @@
+import redis
+import json
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from event_schema import frame_url
+from storage.frame_urls import public_frame_urls
+
+_redis_client = None
+
+def _get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.StrictRedis.from_url(settings.ws_fanout_redis_url)
+    return _redis_client
+
+def publish_notification(message):
+    """
+    Publish a message on the WebSocket fan-out channel.
+
+    Every API worker subscribed to the channel relays it to its WebSocket
+    clients, so this must only be called after the change is committed.
+
+    Args:
+        message (dict): Message with 'type' and 'data' keys.
+    """
+    if not (settings.incident_notify_enabled and settings.ws_fanout_enabled):
+        return
+    try:
+        _get_redis_client().publish(
+            settings.ws_fanout_channel,
+            json.dumps(message, default=str)
+        )
+    except redis.RedisError as e:
+        # Notifications are best effort; the row is already committed
+        print(f"Error publishing notification: {e}")
+
+def publish_new_incident(event):
+    """
+    Notify WebSocket clients about an incident stored from a pipeline event.
+
+    Args:
+        event (dict): The decoded event that was stored.
+    """
+    publish_notification({
+        "type": "new_incident",
+        "data": {
+            "id": event['id'],
+            "incident_type": event['incident'],
+            "confidence": event['confidence'],
+            "frame_urls": public_frame_urls([frame_url(key) for key in event['frames']]),
+            "timestamp": event['timestamp'].isoformat(),
+            "location": event['location'],
+            "verification_status": "pending"
+        }
+    })
+
+def publish_incident_verified(incident_id, status):
+    """
+    Notify WebSocket clients about a verification status change.
+
+    Args:
+        incident_id (str): The incident ID.
+        status (str): The new status.
+    """
+    publish_notification({
+        "type": "incident_verified",
+        "data": {"id": incident_id, "status": status}
+    })
+
+def publish_incidents_verified(results):
+    """
+    Notify WebSocket clients about many verification status changes at once.
+
+    Args:
+        results (list): (incident_id, status) pairs.
+    """
+    publish_notification({
+        "type": "incidents_verified",
+        "data": [{"id": incident_id, "status": status} for incident_id, status in results]
+    })
+
+def publish_incident_merged(incident_id, event):
+    """
+    Notify WebSocket clients that an event was merged into an existing incident.
+
+    Args:
+        incident_id (str): The incident the event was merged into.
+        event (dict): The duplicate event payload.
+    """
+    publish_notification({
+        "type": "incident_merged",
+        # Type and location let subscribed clients filter merges like new incidents
+        "data": {
+            "id": incident_id,
+            "merged_id": event['id'],
+            "incident_type": event['incident'],
+            "confidence": event['confidence'],
+            "location": event['location'],
+        }
+    })
@@ -1,12 +1,14 @@
 import redis
-import json
 import sys
 import os
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
-from tasks.celery_worker import process_incident, send_to_llm_service
+from tasks.celery_client import celery_client, PROCESS_INCIDENT_TASK
+from event_schema import decode_event
+import metrics
+import time
 
 def consume_events():
     """
@@ -24,11 +26,25 @@ def consume_events():
     print(f"Redis Consumer started")
     print(f"Subscribed to Redis channel: {channel}")
     print(f"Waiting for events...")
+    
+    broker_client = redis.StrictRedis.from_url(settings.celery_broker_url)
+    next_depth_sample = 0.0
 
     for message in pubsub.listen():
+        # Sample the Celery backlog at most once per second
+        now = time.monotonic()
+        if now >= next_depth_sample:
+            next_depth_sample = now + 1.0
+            try:
+                metrics.QUEUE_DEPTH.labels(queue='celery').set(broker_client.llen('celery'))
+            except redis.RedisError:
+                pass
+        
         if message['type'] == 'message':
+            metrics.EVENTS_RECEIVED.inc()
             try:
-                event = json.loads(message['data'])
+                payload = message['data']
+                event = decode_event(payload)
                 print(f"\n{'='*60}")
                 print(f"Received event: {event['id']}")
                 print(f"Incident Type: {event['incident']}")
@@ -36,23 +52,21 @@ def consume_events():
                 print(f"Frames: {len(event.get('frames', []))} uploaded")
                 print(f"{'='*60}\n")
                 
-                # Trigger Celery tasks asynchronously
+                # Trigger the Celery task asynchronously
                 
-                # 1. Store incident in database
-                process_incident.delay(event)
+                # Store incident in database (encoded payload forwarded as-is)
+                celery_client.send_task(PROCESS_INCIDENT_TASK, args=[payload])
                 print(f"✓ Queued database storage task for {event['id']}")
+                # LLM verification is queued by process_incident once the
+                # event is stored, so merged events are not verified
                 
-                # 2. Send to LLM service for verification (optional)
-                # Uncomment when LLM service is ready
-                # send_to_llm_service.delay(event)
-                # print(f"✓ Queued LLM verification task for {event['id']}")
-                
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON: {e}")
+            except ValueError as e:
+                print(f"Error decoding event: {e}")
             except Exception as e:
                 print(f"Error processing event: {e}")
 
 if __name__ == "__main__":
+    metrics.start_metrics_server(settings.consumer_metrics_port)
     try:
         consume_events()
     except KeyboardInterrupt:
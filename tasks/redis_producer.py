@@ -1,16 +1,35 @@
 import redis
-import json
+import sys
+import os
+from datetime import datetime
 
-def publish_event(event):
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from event_schema import encode_event
+
+_redis_client = None
+
+def get_redis_client():
+    """Return a shared Redis client so publishers reuse one connection pool."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.StrictRedis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db
+        )
+    return _redis_client
+
+def publish_event(event, channel='events'):
     """
-    Publishes an event to the Redis channel.
+    Publishes an event to the Redis channel in the compact wire format.
 
     Args:
         event (dict): The event payload to publish.
+        channel (str): The Redis channel to publish to.
     """
-    redis_client = redis.StrictRedis(host='localhost', port=6379, db=0)
-    channel = 'events'
-    redis_client.publish(channel, json.dumps(event))
+    get_redis_client().publish(channel, encode_event(event))
 
 if __name__ == "__main__":
     # Example event payload
@@ -19,14 +38,14 @@ if __name__ == "__main__":
         "incident": "accident",
         "confidence": 0.85,
         "frames": [
-            "s3://frames/incident_123_f1.jpg",
-            "s3://frames/incident_123_f2.jpg"
+            "incident_123_f1.jpg",
+            "incident_123_f2.jpg"
         ],
-        "timestamp": "2025-11-18T12:00:00Z",
+        "timestamp": datetime(2025, 11, 18, 12, 0, 0),
         "location": {
             "lat": 11.0222,
             "lon": 77.0133
         }
     }
 
-    publish_event(event)
\ No newline at end of file
+    publish_event(event)
@@ -0,0 +1,20 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Modules import each other relative to the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def non_utc_timezone(monkeypatch):
+    """Run a test with the process local time zone set away from UTC."""
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset is not available on this platform")
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("geoalchemy2")
+
+from pydantic import ValidationError
+
+from backend.main import BulkIncidents, IncidentCreate
+
+
+def incident(**overrides):
+    item = {
+        "incident": "fire",
+        "confidence": 0.9,
+        "frame_urls": ["incident_1_f1.jpg"],
+        "timestamp": "2024-05-01T12:00:00",
+        "location": {"lat": 11.0, "lon": 77.0},
+    }
+    item.update(overrides)
+    return item
+
+
+@pytest.mark.parametrize("timestamp", [
+    "2024-05-01T12:00:00",
+    "2024-05-01T12:00:00Z",
+    "2024-05-01T17:30:00+05:30",
+])
+def test_timestamps_are_naive_utc(timestamp):
+    expected = datetime(2024, 5, 1, 12, 0, 0)
+    assert IncidentCreate(**incident(timestamp=timestamp)).timestamp == expected
+    [bulk] = BulkIncidents.validate_python([incident(id="a", timestamp=timestamp)])
+    assert bulk.timestamp == expected
+
+
+def test_create_rejects_client_id():
+    with pytest.raises(ValidationError):
+        IncidentCreate(**incident(id="a"))
+
+
+def test_bulk_size_is_capped():
+    from config import settings
+    with pytest.raises(ValidationError) as info:
+        BulkIncidents.validate_python([incident()] * (settings.bulk_max_incidents + 1))
+    assert any(error["type"] == "too_long" for error in info.value.errors())
+
+
+def test_stats_range_is_naive_utc():
+    from datetime import timedelta, timezone
+    from backend.main import utc_range
+    ist = timezone(timedelta(hours=5, minutes=30))
+    since, until = utc_range(datetime(2024, 5, 1, 17, 30, tzinfo=ist), datetime(2024, 5, 2))
+    assert since == datetime(2024, 5, 1, 12, 0)
+    assert until == datetime(2024, 5, 2)
+    assert utc_range(None, None) == (None, None)
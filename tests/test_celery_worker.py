@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("celery")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("geoalchemy2")
+pytest.importorskip("msgpack")
+
+import tasks.celery_worker as worker
+import tasks.llm_dispatcher as llm_dispatcher
+from event_schema import encode_event
+
+
+@pytest.fixture
+def run_incident(monkeypatch):
+    """Run process_incident with storage stubbed to a given outcome; returns queued payloads."""
+    queued = []
+    monkeypatch.setattr(worker.settings, "llm_verification_enabled", True)
+    monkeypatch.setattr(worker, "already_processed", lambda event_id: False)
+    monkeypatch.setattr(worker, "mark_processed", lambda event_id: None)
+    monkeypatch.setattr(worker, "publish_new_incident", lambda event: None)
+    monkeypatch.setattr(worker, "publish_incident_merged", lambda incident_id, event: None)
+    monkeypatch.setattr(llm_dispatcher, "enqueue_for_verification", lambda client, payload: queued.append(payload))
+    monkeypatch.setattr("tasks.redis_producer.get_redis_client", lambda: None)
+
+    def run(outcome, payload):
+        async def store(event):
+            return outcome, "incident_stored" if outcome == "merged" else event["id"]
+        monkeypatch.setattr(worker, "store_incident_in_db", store)
+        return worker.process_incident(payload), queued
+    return run
+
+
+def make_payload():
+    return encode_event({
+        "id": "incident_1",
+        "incident": "fire",
+        "confidence": 0.9,
+        "frames": ["incident_1_f1.jpg"],
+        "timestamp": datetime(2024, 5, 1, 12, 0, 0),
+        "location": {"lat": 11.0, "lon": 77.0},
+        "camera_id": "cam",
+    })
+
+
+def test_stored_incident_is_queued_for_verification(run_incident):
+    payload = make_payload()
+    result, queued = run_incident("inserted", payload)
+    assert result["status"] == "success"
+    assert queued == [payload]
+
+
+@pytest.mark.parametrize("outcome", ["merged", "exists"])
+def test_merged_or_existing_events_are_not_verified(run_incident, outcome):
+    result, queued = run_incident(outcome, make_payload())
+    assert result["status"] in ("merged", "duplicate")
+    assert queued == []
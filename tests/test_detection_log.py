@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from vision.detection_log import DetectionLogWriter, iter_frames
+
+T0 = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def write_log(root, frames):
+    writer = DetectionLogWriter(str(root), "cam", chunk_frames=1000, chunk_seconds=3600)
+    for i in range(frames):
+        boxes = np.array([[i, i, i + 10, i + 10]], dtype=np.float32)
+        writer.append(T0 + timedelta(seconds=i), (480, 640), (boxes, np.array([0.9]), np.array([2])))
+    writer.close()
+
+
+def test_round_trip(tmp_path):
+    write_log(tmp_path, 3)
+    frames = list(iter_frames(str(tmp_path), "cam"))
+    assert [f[0] for f in frames] == [T0 + timedelta(seconds=i) for i in range(3)]
+    timestamp, shape, boxes, scores, class_ids = frames[1]
+    assert shape == (480, 640)
+    np.testing.assert_array_equal(boxes, [[1, 1, 11, 11]])
+    assert class_ids.tolist() == [2]
+
+
+def test_timestamps_and_window_are_utc(tmp_path, non_utc_timezone):
+    write_log(tmp_path, 5)
+    # Naive bounds, as parsed from the replay CLI, mean UTC
+    start = datetime(2024, 5, 1, 12, 0, 1)
+    end = datetime(2024, 5, 1, 12, 0, 3)
+    timestamps = [f[0] for f in iter_frames(str(tmp_path), "cam", start, end)]
+    assert timestamps == [T0 + timedelta(seconds=i) for i in (1, 2, 3)]
+    assert all(t.utcoffset() == timedelta(0) for t in timestamps)
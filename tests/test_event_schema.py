@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("msgpack")
+pytest.importorskip("pydantic_settings")
+
+from event_schema import encode_event, decode_event, event_to_dict
+
+
+def make_event(timestamp):
+    return {
+        "id": "incident_1",
+        "incident": "fire",
+        "confidence": 0.9,
+        "frames": ["incident_1_f1.jpg"],
+        "timestamp": timestamp,
+        "location": {"lat": 11.0, "lon": 77.0},
+        "camera_id": "gate",
+    }
+
+
+@pytest.mark.parametrize("wire_format", ["msgpack", "json"])
+def test_round_trip_is_utc_under_non_utc_tz(non_utc_timezone, wire_format):
+    aware = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+    decoded = decode_event(encode_event(make_event(aware), wire_format))
+    assert decoded["timestamp"] == datetime(2024, 5, 1, 7, 0, 15, 123000)
+    assert decoded["timestamp"].tzinfo is None
+
+
+def test_naive_timestamps_are_taken_as_utc(non_utc_timezone):
+    naive = datetime(2024, 1, 1, 0, 0, 0, 1000)
+    decoded = decode_event(encode_event(make_event(naive)))
+    assert decoded["timestamp"] == naive
+    # Legacy JSON consumers see the same instant
+    assert decode_event(event_to_dict(decoded))["timestamp"] == naive
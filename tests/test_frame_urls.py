@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("minio")
+
+import storage.minio_client
+from storage import frame_urls
+from storage.frame_urls import PresignedUrlCache, public_frame_urls, unsigned_frame_keys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def presigned(monkeypatch):
+    """Presigned mode with a fresh cache and a fake signer; returns the keys signed."""
+    signed = []
+
+    def get_presigned_url(bucket, key, expires):
+        signed.append(key)
+        return f"https://signed/{key}"
+
+    monkeypatch.setattr(frame_urls.settings, "frame_url_mode", "presigned")
+    monkeypatch.setattr(frame_urls, "presigned_urls", PresignedUrlCache())
+    monkeypatch.setattr(storage.minio_client, "get_presigned_url", get_presigned_url)
+    return signed
+
+
+def test_storage_does_not_import_the_api():
+    code = "import sys, storage.frame_urls; print(any(m.split('.')[0] == 'backend' for m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_unsigned_keys_are_signed_ahead(presigned):
+    urls = ["a.jpg", "b.jpg", "a.jpg", "https://elsewhere/c.jpg"]
+    assert sorted(unsigned_frame_keys(urls)) == ["a.jpg", "b.jpg"]
+    frame_urls.presigned_urls.sign(unsigned_frame_keys(urls))
+    assert unsigned_frame_keys(urls) == []
+    assert public_frame_urls(urls, sign=False)[:2] == ["https://signed/a.jpg", "https://signed/b.jpg"]
+    assert sorted(presigned) == ["a.jpg", "b.jpg"]
+
+
+def test_no_signing_without_sign(presigned):
+    assert public_frame_urls(["a.jpg"], sign=False) == ["a.jpg"]
+    assert presigned == []
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("pydantic_settings")
+
+from backend.frames import parse_range, etag_matches
+
+
+@pytest.mark.parametrize("header, size, expected", [
+    ("bytes=0-99", 1000, (0, 99)),
+    ("bytes=100-", 1000, (100, 999)),
+    ("bytes=900-2000", 1000, (900, 999)),
+    ("bytes=-100", 1000, (900, 999)),
+    ("bytes=-5000", 1000, (0, 999)),
+    ("bytes=49-49", 50, (49, 49)),
+])
+def test_parse_range_satisfiable(header, size, expected):
+    assert parse_range(header, size) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=100-", 50),
+    ("bytes=50-60", 50),
+    ("bytes=-0", 50),
+    ("bytes=-10", 0),
+    ("bytes=0-", 0),
+])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-10",
+    "bytes=",
+    "bytes=-",
+    "bytes=a-b",
+    "bytes=10-5",
+    "bytes=0-10,20-30",
+])
+def test_parse_range_ignored(header):
+    assert parse_range(header, 1000) is None
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', "abc")
+    assert etag_matches('W/"abc", "def"', "abc")
+    assert etag_matches("*", "abc")
+    assert not etag_matches('"def"', "abc")
+    assert not etag_matches(None, "abc")
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("msgpack")
+pytest.importorskip("pydantic_settings")
+
+from event_schema import encode_event
+from tasks.llm_dispatcher import ServiceError, VerificationDispatcher
+
+
+class FakeRedis:
+    """The few async Redis list and hash commands the dispatcher uses."""
+
+    def __init__(self):
+        self.lists = {}
+        self.hashes = {}
+
+    async def lpush(self, key, *values):
+        for value in values:
+            self.lists.setdefault(key, []).insert(0, value)
+
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    async def hincrby(self, key, field, amount=1):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+
+def payload(event_id):
+    return encode_event({
+        "id": event_id,
+        "incident": "fire",
+        "confidence": 0.9,
+        "frames": [],
+        "timestamp": datetime(2024, 5, 1, 12, 0, 0),
+        "location": {"lat": 11.0, "lon": 77.0},
+        "camera_id": "cam",
+    })
+
+
+def make_dispatcher(fail, max_attempts=3):
+    redis = FakeRedis()
+    dispatcher = VerificationDispatcher(
+        redis, http_client=None, write_results=lambda results: None,
+        queue_key="q", max_attempts=max_attempts, dead_letter_key="q:dead",
+    )
+
+    async def verify(payloads):
+        if fail:
+            raise ServiceError("LLM service returned 500")
+        return []
+    dispatcher._verify = verify
+    return dispatcher, redis
+
+
+def dispatch(dispatcher, payloads):
+    async def run():
+        await dispatcher.slots.acquire()
+        await dispatcher._dispatch(payloads)
+    asyncio.run(run())
+
+
+def test_failing_event_is_dead_lettered_after_max_attempts():
+    dispatcher, redis = make_dispatcher(fail=True, max_attempts=3)
+    event = payload("incident_1")
+    for attempt in range(1, 3):
+        dispatch(dispatcher, [event])
+        assert redis.lists["q"] == [event]
+        assert redis.hashes["q:attempts"]["incident_1"] == attempt
+        redis.lists["q"].clear()
+    dispatch(dispatcher, [event])
+    assert redis.lists["q"] == []
+    assert redis.lists["q:dead"] == [event]
+    assert "incident_1" not in redis.hashes["q:attempts"]
+
+
+def test_repeat_failures_go_to_the_tail():
+    dispatcher, redis = make_dispatcher(fail=True)
+    first, repeat = payload("incident_1"), payload("incident_2")
+    redis.hashes["q:attempts"] = {"incident_2": 1}
+    redis.lists["q"] = [payload("queued")]
+    dispatch(dispatcher, [first, repeat])
+    assert redis.lists["q"] == [first, payload("queued"), repeat]
+
+
+def test_success_clears_attempts():
+    dispatcher, redis = make_dispatcher(fail=False)
+    redis.hashes["q:attempts"] = {"incident_1": 2}
+    dispatch(dispatcher, [payload("incident_1")])
+    assert redis.hashes["q:attempts"] == {}
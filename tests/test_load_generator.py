@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("geoalchemy2")
+pytest.importorskip("redis")
+
+from sqlalchemy.dialects import postgresql
+
+from tasks.load_generator import LOAD_ID_PREFIX, delete_load_rows_statement
+
+
+def compiled(prefix):
+    return delete_load_rows_statement(prefix).compile(dialect=postgresql.dialect())
+
+
+def test_cleanup_matches_prefix_literally():
+    statement = compiled(LOAD_ID_PREFIX)
+    assert "ESCAPE '/'" in str(statement)
+    # "_" must not act as a single-character wildcard ("loader-...", "loads...")
+    assert list(statement.params.values()) == ["load/_"]
+
+
+def test_cleanup_escapes_run_prefix():
+    statement = compiled("load_ab%c_")
+    assert list(statement.params.values()) == ["load/_ab/%c/_"]
@@ -0,0 +1,161 @@
+import numpy as np
+import pytest
+
+from vision.rules import RuleSet, tile_windows
+
+CLASS_NAMES = ["person", "bicycle", "car", "motorcycle", "airplane", "bus"]
+
+FRAME_SHAPE = (1000, 1000, 3)
+
+
+def detections(boxes, scores, class_ids):
+    return (
+        np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+        np.asarray(scores, dtype=np.float32),
+        np.asarray(class_ids, dtype=np.int64),
+    )
+
+
+def compile_rules(rules, **camera):
+    config = {"defaults": {"rules": rules}, "cameras": {"cam": camera}}
+    return RuleSet(config, CLASS_NAMES, default_confidence=0.5).for_camera("cam")
+
+
+def test_confidence_thresholds_and_unmapped_classes():
+    rules = compile_rules([
+        {"classes": ["person"], "incident": "person_detected", "confidence": 0.7},
+        {"classes": ["car", "bus"], "incident": "traffic"},
+    ])
+    boxes = [[100, 100, 200, 200]] * 5
+    mask, rule_index = rules.evaluate(
+        detections(boxes, [0.8, 0.6, 0.55, 0.45, 0.99], [0, 0, 2, 5, 1]), FRAME_SHAPE
+    )
+    # Without its own confidence a rule keeps what the model returned
+    assert mask.tolist() == [True, False, True, True, False]
+    assert rule_index.tolist() == [0, 0, 1, 1, -1]
+
+
+def test_configured_default_confidence_checks_score():
+    config = {
+        "defaults": {"confidence": 0.5, "rules": [{"classes": ["car"], "incident": "traffic"}]},
+    }
+    rules = RuleSet(config, CLASS_NAMES).for_camera("cam")
+    mask, _ = rules.evaluate(detections([[0, 0, 100, 100]] * 2, [0.6, 0.4], [2, 2]), FRAME_SHAPE)
+    assert mask.tolist() == [True, False]
+
+
+def test_class_map_rules_match_model_prefilter():
+    rules = RuleSet.from_class_map({0: "person_detected"}, CLASS_NAMES, 0.5).for_camera("cam")
+    assert rules.min_threshold == 0.5
+    # objectness 0.6 x class confidence 0.6 passed the model's 0.5 pre-filter
+    mask, _ = rules.evaluate(detections([[0, 0, 100, 100]], [0.36], [0]), FRAME_SHAPE)
+    assert mask.tolist() == [True]
+
+
+def test_min_box_area():
+    rules = compile_rules([{"classes": ["car"], "incident": "traffic", "min_box_area": 0.01}])
+    # 0.01 of a 1000x1000 frame is a 100x100 box
+    boxes = [[0, 0, 100, 100], [0, 0, 99, 99]]
+    mask, _ = rules.evaluate(detections(boxes, [0.9, 0.9], [2, 2]), FRAME_SHAPE)
+    assert mask.tolist() == [True, False]
+
+
+def test_roi_uses_bottom_centre_of_box():
+    lower_half = [[[0.0, 0.5], [1.0, 0.5], [1.0, 1.0], [0.0, 1.0]]]
+    rules = compile_rules([{"classes": ["person"], "incident": "person_detected"}], roi=lower_half)
+    boxes = [
+        [100, 100, 200, 300],  # entirely in the upper half
+        [100, 300, 200, 700],  # straddles, but stands in the lower half
+        [100, 600, 200, 900],
+    ]
+    mask, _ = rules.evaluate(detections(boxes, [0.9] * 3, [0] * 3), FRAME_SHAPE)
+    assert mask.tolist() == [False, True, True]
+
+
+def test_rule_roi_overrides_camera_roi():
+    left = [[[0.0, 0.0], [0.5, 0.0], [0.5, 1.0], [0.0, 1.0]]]
+    right = [[[0.5, 0.0], [1.0, 0.0], [1.0, 1.0], [0.5, 1.0]]]
+    rules = compile_rules(
+        [
+            {"classes": ["person"], "incident": "person_detected"},
+            {"classes": ["car"], "incident": "traffic", "roi": right},
+        ],
+        roi=left,
+    )
+    boxes = [[100, 100, 200, 200], [800, 100, 900, 200]] * 2
+    mask, _ = rules.evaluate(detections(boxes, [0.9] * 4, [0, 0, 2, 2]), FRAME_SHAPE)
+    assert mask.tolist() == [True, False, False, True]
+
+
+def test_min_count_counts_qualifying_objects_only():
+    rules = compile_rules([{"classes": ["car", "bus"], "incident": "traffic", "min_count": 3, "confidence": 0.5}])
+    boxes = [[100 * i, 100, 100 * i + 50, 150] for i in range(4)]
+    mask, _ = rules.evaluate(detections(boxes[:3], [0.9, 0.9, 0.9], [2, 5, 2]), FRAME_SHAPE)
+    assert mask.all()
+    # The low-confidence car does not count towards min_count
+    mask, _ = rules.evaluate(detections(boxes[:3], [0.9, 0.9, 0.1], [2, 5, 2]), FRAME_SHAPE)
+    assert not mask.any()
+
+
+def test_camera_overrides_defaults():
+    config = {
+        "defaults": {"rules": [{"classes": ["person"], "incident": "person_detected"}]},
+        "cameras": {"gate": {"rules": [{"classes": ["car"], "incident": "traffic", "cooldown_seconds": 60}]}},
+    }
+    rule_set = RuleSet(config, CLASS_NAMES)
+    dets = detections([[0, 0, 100, 100]] * 2, [0.9, 0.9], [0, 2])
+    mask, _ = rule_set.for_camera("gate").evaluate(dets, FRAME_SHAPE)
+    assert mask.tolist() == [False, True]
+    mask, _ = rule_set.for_camera("other").evaluate(dets, FRAME_SHAPE)
+    assert mask.tolist() == [True, False]
+    assert rule_set.for_camera("gate").cooldown_for("traffic") == 60.0
+
+
+def test_no_detections():
+    rules = compile_rules([{"classes": ["person"], "incident": "person_detected"}])
+    mask, rule_index = rules.evaluate(detections([], [], []), FRAME_SHAPE)
+    assert mask.shape == rule_index.shape == (0,)
+
+
+def test_class_mapped_twice_is_rejected():
+    with pytest.raises(ValueError):
+        compile_rules([
+            {"classes": ["car"], "incident": "traffic"},
+            {"classes": ["car"], "incident": "parking"},
+        ])
+
+
+def test_tile_windows_default_is_whole_frame():
+    assert tile_windows((1920, 1080)) == [(0, 0, 1920, 1080)]
+
+
+def test_tile_windows_crop():
+    assert tile_windows((1000, 500), crop=(0.1, 0.2, 0.6, 1.0)) == [(100, 100, 600, 500)]
+
+
+@pytest.mark.parametrize("frame_size, crop, tiles, overlap", [
+    ((1920, 1080), None, (3, 2), 0.2),
+    ((1280, 720), (0.0, 0.3, 1.0, 1.0), (2, 2), 0.25),
+    ((641, 479), (0.13, 0.07, 0.91, 0.88), (4, 3), 0.1),
+    ((1000, 1000), None, (5, 1), 0.0),
+])
+def test_tile_windows_cover_crop(frame_size, crop, tiles, overlap):
+    w, h = frame_size
+    windows = tile_windows(frame_size, crop, tiles, overlap)
+    assert len(windows) == tiles[0] * tiles[1]
+
+    cx1, cy1, cx2, cy2 = crop or (0.0, 0.0, 1.0, 1.0)
+    expected = np.zeros((h, w), dtype=bool)
+    expected[int(round(cy1 * h)):int(round(cy2 * h)), int(round(cx1 * w)):int(round(cx2 * w))] = True
+    covered = np.zeros((h, w), dtype=bool)
+    for x1, y1, x2, y2 in windows:
+        assert x1 < x2 and y1 < y2
+        covered[y1:y2, x1:x2] = True
+    # Every pixel of the crop is covered, and nothing outside it
+    np.testing.assert_array_equal(covered, expected)
+
+    # Neighbouring tiles share about `overlap` of a tile
+    x1, _, x2, _ = windows[0]
+    if tiles[0] > 1:
+        next_x1 = windows[1][0]
+        assert abs((x2 - next_x1) - overlap * (x2 - x1)) <= 1
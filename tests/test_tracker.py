@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from vision.tracker import IoUTracker, iou_matrix
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def step(tracker, boxes, class_ids, frame):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.full(len(boxes), 0.9, dtype=np.float32)
+    return tracker.update(boxes, scores, np.asarray(class_ids), T0 + timedelta(seconds=frame))
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 1 / 3, 0.0]], rtol=1e-6)
+
+
+def test_iou_matrix_degenerate_boxes():
+    a = np.array([[5, 5, 5, 5]], dtype=np.float32)
+    assert iou_matrix(a, a)[0, 0] == 0.0
+
+
+def test_triggers_once_min_hits_reached():
+    tracker = IoUTracker(min_hits=3)
+    box = [[100, 100, 200, 200]]
+    assert step(tracker, box, [0], 0) == []
+    assert step(tracker, box, [0], 1) == []
+    triggered = step(tracker, box, [0], 2)
+    assert len(triggered) == 1
+    assert triggered[0].hits == 3
+    assert len(tracker.tracks) == 1
+
+
+def test_unfired_track_is_offered_again():
+    tracker = IoUTracker(min_hits=2)
+    box = [[100, 100, 200, 200]]
+    step(tracker, box, [0], 0)
+    first = step(tracker, box, [0], 1)
+    # Held back by the caller (e.g. cooldown): still eligible next frame
+    assert step(tracker, box, [0], 2) == first
+    first[0].fired = True
+    assert step(tracker, box, [0], 3) == []
+
+
+def test_missing_track_does_not_trigger():
+    tracker = IoUTracker(min_hits=2, max_missed=5)
+    box = [[100, 100, 200, 200]]
+    step(tracker, box, [0], 0)
+    step(tracker, box, [0], 1)
+    assert step(tracker, [], [], 2) == []
+    assert len(step(tracker, box, [0], 3)) == 1
+
+
+def test_matching_follows_moving_box():
+    tracker = IoUTracker(min_hits=10)
+    step(tracker, [[0, 0, 100, 100]], [0], 0)
+    step(tracker, [[30, 0, 130, 100]], [0], 1)
+    assert len(tracker.tracks) == 1
+    assert tracker.tracks[0].hits == 2
+
+
+def test_centroid_fallback_for_fast_movers():
+    tracker = IoUTracker(min_hits=10, centroid_threshold=1.0)
+    step(tracker, [[0, 0, 100, 100]], [0], 0)
+    # No overlap, but the centre moved less than one box diagonal
+    step(tracker, [[110, 0, 210, 100]], [0], 1)
+    assert [t.hits for t in tracker.tracks] == [2]
+
+    tracker = IoUTracker(min_hits=10, centroid_threshold=0.0)
+    step(tracker, [[0, 0, 100, 100]], [0], 0)
+    step(tracker, [[110, 0, 210, 100]], [0], 1)
+    assert len(tracker.tracks) == 2
+
+
+def test_classes_are_tracked_separately():
+    tracker = IoUTracker(min_hits=10)
+    step(tracker, [[0, 0, 100, 100]], [0], 0)
+    step(tracker, [[0, 0, 100, 100]], [2], 1)
+    assert sorted(t.class_id for t in tracker.tracks) == [0, 2]
+    assert all(t.hits == 1 for t in tracker.tracks)
+
+
+def test_each_detection_matches_one_track():
+    tracker = IoUTracker(min_hits=10)
+    boxes = [[0, 0, 100, 100], [300, 300, 400, 400]]
+    step(tracker, boxes, [0, 0], 0)
+    step(tracker, boxes[::-1], [0, 0], 1)
+    assert [t.hits for t in tracker.tracks] == [2, 2]
+    np.testing.assert_array_equal(tracker.tracks[0].box, boxes[0])
+
+
+@pytest.mark.parametrize("max_missed", [0, 3])
+def test_track_dropped_after_max_missed(max_missed):
+    tracker = IoUTracker(max_missed=max_missed)
+    step(tracker, [[0, 0, 100, 100]], [0], 0)
+    for frame in range(1, max_missed + 1):
+        step(tracker, [], [], frame)
+        assert len(tracker.tracks) == 1
+    step(tracker, [], [], max_missed + 1)
+    assert tracker.tracks == []
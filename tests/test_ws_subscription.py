@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("pydantic_settings")
+
+from backend.ws_manager import Subscription
+
+
+def merged(incident_type, lat, lon):
+    return {
+        "type": "incident_merged",
+        "data": {
+            "id": "incident_1",
+            "merged_id": "incident_2",
+            "incident_type": incident_type,
+            "confidence": 0.9,
+            "location": {"lat": lat, "lon": lon},
+        },
+    }
+
+
+def test_merges_are_filtered_like_new_incidents():
+    subscription = Subscription(incident_types=["fire"], bbox=[77.0, 11.0, 77.1, 11.1])
+    assert subscription.matches(merged("fire", 11.05, 77.05))
+    assert not subscription.matches(merged("garbage", 11.05, 77.05))
+    assert not subscription.matches(merged("fire", 12.0, 77.05))
+
+
+def test_control_messages_reach_everyone():
+    subscription = Subscription(incident_types=["fire"])
+    assert subscription.matches({"type": "incident_verified", "data": {"id": "x", "status": "verified"}})
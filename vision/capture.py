@@ -0,0 +1,220 @@
+"""
+Configurable stream capture backends.
+
+open_capture() returns an object with the cv2.VideoCapture reading
+interface (isOpened, read, release) for one of two backends:
+
+- "opencv": cv2.VideoCapture on the FFmpeg backend, with RTSP transport,
+  low-latency demuxer flags, a small capture buffer and optional hardware
+  decoding
+- "pyav":   a PyAV (libav) reader that converts and downscales each frame
+  to BGR in a single swscale pass, and can decode keyframes only
+
+Options come from CAPTURE_* settings and can be overridden per camera with
+a "capture" entry in the rules file, next to "rules" and "roi":
+
+    "cameras": {
+      "junction-3": {
+        "capture": {"backend": "pyav", "transport": "tcp", "max_width": 1280}
+      }
+    }
+
+Keys: backend, transport ("tcp", "udp" or "" for the FFmpeg default),
+low_latency, buffer_size, hw_accel ("none", "any", "vaapi", "d3d11",
+"mfx"), max_width (0 keeps the stream resolution), keyframes_only
+(pyav only) and open_timeout_ms / read_timeout_ms.
+"""
+import json
+import os
+import sys
+
+import cv2
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+CAPTURE_BACKENDS = ("opencv", "pyav")
+
+HW_ACCELERATION = {
+    "none": cv2.VIDEO_ACCELERATION_NONE,
+    "any": cv2.VIDEO_ACCELERATION_ANY,
+    "vaapi": cv2.VIDEO_ACCELERATION_VAAPI,
+    "d3d11": cv2.VIDEO_ACCELERATION_D3D11,
+    "mfx": cv2.VIDEO_ACCELERATION_MFX,
+}
+
+
+def default_capture_options():
+    return {
+        "backend": settings.capture_backend,
+        "transport": settings.capture_transport,
+        "low_latency": settings.capture_low_latency,
+        "buffer_size": settings.capture_buffer_size,
+        "hw_accel": settings.capture_hw_accel,
+        "max_width": settings.capture_max_width,
+        "keyframes_only": False,
+        "open_timeout_ms": settings.capture_open_timeout_ms,
+        "read_timeout_ms": settings.capture_read_timeout_ms,
+    }
+
+
+def load_capture_options(camera_id, rules_path=None):
+    """
+    Capture options for a camera: settings, then the rules file's default
+    and per-camera "capture" entries.
+    """
+    options = default_capture_options()
+    rules_path = rules_path or settings.rules_config_path
+    if rules_path:
+        with open(rules_path) as f:
+            config = json.load(f)
+        options.update(config.get("defaults", {}).get("capture", {}))
+        options.update(config.get("cameras", {}).get(camera_id, {}).get("capture", {}))
+    if options["backend"] not in CAPTURE_BACKENDS:
+        raise ValueError(f"Unknown capture backend {options['backend']!r}; expected one of {CAPTURE_BACKENDS}")
+    if options["hw_accel"] not in HW_ACCELERATION:
+        raise ValueError(f"Unknown hw_accel {options['hw_accel']!r}; expected one of {list(HW_ACCELERATION)}")
+    return options
+
+
+def ffmpeg_options(options):
+    """FFmpeg demuxer/decoder options for the transport and latency settings."""
+    ffmpeg = {}
+    if options.get("transport"):
+        ffmpeg["rtsp_transport"] = options["transport"]
+    if options.get("low_latency"):
+        # Don't buffer input for probing, and emit frames as soon as they decode
+        ffmpeg["fflags"] = "nobuffer"
+        ffmpeg["flags"] = "low_delay"
+        ffmpeg["max_delay"] = "0"
+    return ffmpeg
+
+
+def scaled_size(width, height, max_width):
+    """Output size for a frame capped at max_width, keeping the aspect ratio (even dimensions)."""
+    if not max_width or width <= max_width:
+        return width, height
+    return max_width, max(2, int(round(height * max_width / width / 2)) * 2)
+
+
+class OpenCVCapture:
+    """
+    cv2.VideoCapture on the FFmpeg backend with capture options applied.
+
+    FFmpeg options reach OpenCV through OPENCV_FFMPEG_CAPTURE_OPTIONS, which
+    is read when the stream is opened. OpenCV has no decoder-side scaling,
+    so max_width downscales after decode with INTER_AREA.
+    """
+
+    def __init__(self, source, options):
+        self.max_width = options.get("max_width", 0)
+        params = [
+            cv2.CAP_PROP_HW_ACCELERATION, HW_ACCELERATION[options.get("hw_accel", "none")],
+        ]
+        if options.get("open_timeout_ms"):
+            params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(options["open_timeout_ms"])]
+        if options.get("read_timeout_ms"):
+            params += [cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(options["read_timeout_ms"])]
+
+        if isinstance(source, int):
+            # Local devices don't go through FFmpeg
+            self.cap = cv2.VideoCapture(source)
+        else:
+            ffmpeg = ffmpeg_options(options)
+            previous = os.environ.get("OPENCV_FFMPEG_CAPTURE_OPTIONS")
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "|".join(f"{k};{v}" for k, v in ffmpeg.items())
+            try:
+                self.cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG, params)
+            finally:
+                if previous is None:
+                    os.environ.pop("OPENCV_FFMPEG_CAPTURE_OPTIONS", None)
+                else:
+                    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = previous
+
+        if options.get("buffer_size"):
+            # Keep only the newest frames queued, so a slow reader sees fresh ones
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, int(options["buffer_size"]))
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if ret and self.max_width and frame.shape[1] > self.max_width:
+            width, height = scaled_size(frame.shape[1], frame.shape[0], self.max_width)
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVCapture:
+    """
+    Stream reader on PyAV.
+
+    Decoding runs with frame threading, and each frame is converted to BGR
+    at the target size by swscale in one pass, so downscaled streams never
+    materialize a full-resolution BGR frame.
+    """
+
+    def __init__(self, source, options):
+        import av
+        import av.error
+
+        self.max_width = options.get("max_width", 0)
+        self.container = None
+        self._frames = None
+        timeout = None
+        if options.get("open_timeout_ms") or options.get("read_timeout_ms"):
+            timeout = (
+                (options.get("open_timeout_ms") or 0) / 1000 or None,
+                (options.get("read_timeout_ms") or 0) / 1000 or None,
+            )
+        try:
+            self.container = av.open(source, options=ffmpeg_options(options), timeout=timeout)
+        except (av.error.FFmpegError, OSError) as e:
+            print(f"PyAV could not open {source}: {e}")
+            return
+        stream = self.container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if options.get("keyframes_only"):
+            stream.codec_context.skip_frame = "NONKEY"
+        self._frames = self.container.decode(stream)
+        self._av_error = av.error.FFmpegError
+
+    def isOpened(self):
+        return self._frames is not None
+
+    def read(self):
+        if self._frames is None:
+            return False, None
+        try:
+            frame = next(self._frames)
+        except (StopIteration, self._av_error, OSError):
+            return False, None
+        width, height = scaled_size(frame.width, frame.height, self.max_width)
+        return True, frame.to_ndarray(format="bgr24", width=width, height=height)
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+            self._frames = None
+
+
+def open_capture(source, options=None):
+    """
+    Open a stream with the configured backend.
+
+    Args:
+        source (str or int): Stream URL, file path or webcam index (a digit string works too).
+        options (dict): Capture options; defaults from settings.
+    """
+    options = {**default_capture_options(), **(options or {})}
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if options["backend"] == "pyav" and not isinstance(source, int):
+        return PyAVCapture(source, options)
+    return OpenCVCapture(source, options)
@@ -0,0 +1,180 @@
+"""
+Append-only log of raw detections for replay and offline re-scoring.
+
+Every frame's model output (before rules) is recorded per camera as two
+fixed-width NumPy record arrays and written out in chunks:
+
+    <root>/<camera_id>/<first_ms>-<last_ms>.detections.npy
+    <root>/<camera_id>/<first_ms>-<last_ms>.frames.npy
+
+A frame record holds the timestamp, frame size and the slice of the
+chunk's detection records that belong to it; a detection record is the
+box (frame pixels), score and class id, 22 bytes. Chunks are plain .npy
+files, so readers memory-map them and only touch the pages they use.
+A chunk is never modified after it is written, and the frames file is
+renamed into place last, so a chunk without one is incomplete and skipped.
+
+The log holds what the model returned, so replays can tighten thresholds
+and change ROIs, rules and cooldowns, but cannot go below the model
+confidence threshold in effect while logging.
+"""
+from datetime import datetime, timezone
+import os
+
+import numpy as np
+
+FRAME_DTYPE = np.dtype([
+    ("timestamp_ms", "<i8"),
+    ("height", "<u2"),
+    ("width", "<u2"),
+    ("first", "<u4"),
+    ("count", "<u4"),
+])
+
+DETECTION_DTYPE = np.dtype([
+    ("box", "<f4", (4,)),
+    ("score", "<f4"),
+    ("class_id", "<u2"),
+])
+
+
+def _to_ms(timestamp):
+    """UTC epoch milliseconds for a datetime (naive means UTC) or a number of ms."""
+    if not isinstance(timestamp, datetime):
+        return int(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+class DetectionLogWriter:
+    """
+    Buffers one camera's detections and writes them out in chunks.
+
+    Args:
+        root (str): Log directory; a subdirectory is created per camera.
+        camera_id (str): Camera being logged.
+        chunk_frames (int): Frames per chunk.
+        chunk_seconds (float): Maximum time span of a chunk, so quiet or
+            slow cameras still reach disk regularly.
+    """
+
+    def __init__(self, root, camera_id, chunk_frames=9000, chunk_seconds=300):
+        self.directory = os.path.join(root, camera_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self.chunk_frames = chunk_frames
+        self.chunk_ms = int(chunk_seconds * 1000)
+        self._frames = []
+        self._detections = []
+        self._detection_count = 0
+
+    def append(self, timestamp, frame_shape, detections):
+        """Record one frame's detections (boxes, scores, class_ids in frame pixels)."""
+        boxes, scores, class_ids = detections
+        timestamp_ms = _to_ms(timestamp)
+        count = len(scores)
+        self._frames.append((timestamp_ms, frame_shape[0], frame_shape[1], self._detection_count, count))
+        if count:
+            records = np.empty(count, dtype=DETECTION_DTYPE)
+            records["box"] = boxes
+            records["score"] = scores
+            records["class_id"] = class_ids
+            self._detections.append(records)
+            self._detection_count += count
+
+        if len(self._frames) >= self.chunk_frames or timestamp_ms - self._frames[0][0] >= self.chunk_ms:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames as a new chunk."""
+        if not self._frames:
+            return
+        frames = np.array(self._frames, dtype=FRAME_DTYPE)
+        detections = (
+            np.concatenate(self._detections) if self._detections else np.empty(0, dtype=DETECTION_DTYPE)
+        )
+        name = f"{frames['timestamp_ms'][0]}-{frames['timestamp_ms'][-1]}"
+        # The frames file marks the chunk complete, so it goes last
+        self._save(f"{name}.detections.npy", detections)
+        self._save(f"{name}.frames.npy", frames)
+        self._frames = []
+        self._detections = []
+        self._detection_count = 0
+
+    def _save(self, filename, array):
+        path = os.path.join(self.directory, filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self.flush()
+
+
+def list_cameras(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+
+
+def list_chunks(root, camera_id, start=None, end=None):
+    """
+    Complete chunks for a camera overlapping [start, end], oldest first.
+
+    Returns:
+        list: (first_ms, last_ms, path_prefix) tuples.
+    """
+    directory = os.path.join(root, camera_id)
+    if not os.path.isdir(directory):
+        return []
+    start_ms = _to_ms(start) if start is not None else None
+    end_ms = _to_ms(end) if end is not None else None
+    chunks = []
+    for filename in os.listdir(directory):
+        if not filename.endswith(".frames.npy"):
+            continue
+        name = filename[:-len(".frames.npy")]
+        first_ms, last_ms = (int(part) for part in name.split("-"))
+        if (start_ms is not None and last_ms < start_ms) or (end_ms is not None and first_ms > end_ms):
+            continue
+        chunks.append((first_ms, last_ms, os.path.join(directory, name)))
+    return sorted(chunks)
+
+
+def load_chunk(path_prefix, mmap=True):
+    """Load a chunk's (frames, detections) record arrays, memory-mapped by default."""
+    mode = "r" if mmap else None
+    frames = np.load(f"{path_prefix}.frames.npy", mmap_mode=mode)
+    detections = np.load(f"{path_prefix}.detections.npy", mmap_mode=mode)
+    return frames, detections
+
+
+def iter_frames(root, camera_id, start=None, end=None):
+    """
+    Replay a camera's logged frames in order.
+
+    Yields:
+        tuple: (timestamp, frame_shape, boxes, scores, class_ids), with
+            timestamp an aware UTC datetime, like the live pipeline's, and
+            frame_shape (height, width). Naive start/end are taken as UTC.
+    """
+    start_ms = _to_ms(start) if start is not None else None
+    end_ms = _to_ms(end) if end is not None else None
+    for _, _, path_prefix in list_chunks(root, camera_id, start, end):
+        frames, detections = load_chunk(path_prefix)
+        # Columns are read once per chunk; per-frame slices are then views
+        boxes = np.asarray(detections["box"], dtype=np.float32)
+        scores = np.asarray(detections["score"], dtype=np.float32)
+        class_ids = np.asarray(detections["class_id"], dtype=np.int64)
+        for timestamp_ms, height, width, first, count in frames.tolist():
+            if start_ms is not None and timestamp_ms < start_ms:
+                continue
+            if end_ms is not None and timestamp_ms > end_ms:
+                break
+            rows = slice(first, first + count)
+            yield (
+                datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc),
+                (height, width),
+                boxes[rows], scores[rows], class_ids[rows],
+            )
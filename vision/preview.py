@@ -0,0 +1,173 @@
+"""
+Low-rate annotated preview for headless pipelines.
+
+Instead of drawing and showing every frame, a preview sink renders at most
+preview_fps frames per second and publishes them either as an MJPEG stream
+over HTTP or as a JPEG file that is atomically replaced.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+import cv2
+import os
+
+
+class PreviewSink:
+    """
+    Rate-limited renderer shared by the preview sinks.
+
+    Args:
+        render_fn (callable): render_fn(frame, detections, frame_count) draws in place.
+        fps (float): Maximum preview frames per second.
+        max_width (int): Frames wider than this are downscaled before encoding.
+        jpeg_quality (int): JPEG quality (0-100).
+    """
+
+    def __init__(self, render_fn, fps=2.0, max_width=960, jpeg_quality=70):
+        self.render_fn = render_fn
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self._next_time = 0.0
+
+    def submit(self, frame, detections, frame_count):
+        """Render and publish the frame if the preview interval has elapsed."""
+        now = time.monotonic()
+        if now < self._next_time:
+            return
+        self._next_time = now + self.interval
+
+        preview = frame.copy()
+        self.render_fn(preview, detections, frame_count)
+        h, w = preview.shape[:2]
+        if self.max_width and w > self.max_width:
+            preview = cv2.resize(preview, (self.max_width, int(h * self.max_width / w)))
+        ok, buffer = cv2.imencode('.jpg', preview, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if ok:
+            self.publish(buffer.tobytes())
+
+    def publish(self, jpeg_bytes):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FilePreviewSink(PreviewSink):
+    """Writes the latest preview to a file, replacing it atomically."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def publish(self, jpeg_bytes):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(jpeg_bytes)
+        os.replace(tmp_path, self.path)
+
+
+class MJPEGPreviewServer(PreviewSink):
+    """
+    Serves the latest preview over HTTP.
+
+    GET /stream is a multipart MJPEG stream viewable in a browser;
+    GET /snapshot.jpg returns the latest frame. There is no authentication,
+    so it listens on localhost unless PREVIEW_HOST says otherwise.
+    """
+
+    def __init__(self, port=8090, host="127.0.0.1", **kwargs):
+        super().__init__(**kwargs)
+        self._frame = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"MJPEG preview available at http://{host}:{port}/stream")
+
+    def publish(self, jpeg_bytes):
+        with self._condition:
+            self._frame = jpeg_bytes
+            self._condition.notify_all()
+
+    def wait_for_frame(self, previous, timeout=5.0):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._closed or self._frame is not previous, timeout=timeout
+            )
+            return self._frame
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith('/snapshot'):
+                    frame = preview._frame
+                    if frame is None:
+                        self.send_error(503, "No preview frame yet")
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', str(len(frame)))
+                    self.send_header('Cache-Control', 'no-store')
+                    self.end_headers()
+                    self.wfile.write(frame)
+                elif self.path.startswith('/stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                    self.send_header('Cache-Control', 'no-store')
+                    self.end_headers()
+                    frame = None
+                    try:
+                        while not preview._closed:
+                            new_frame = preview.wait_for_frame(frame)
+                            if new_frame is None or new_frame is frame:
+                                continue
+                            frame = new_frame
+                            self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n')
+                            self.wfile.write(f'Content-Length: {len(frame)}\r\n\r\n'.encode())
+                            self.wfile.write(frame + b'\r\n')
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                else:
+                    self.send_error(404)
+
+        return Handler
+
+
+def create_preview_sink(mode, render_fn, settings):
+    """
+    Build the preview sink selected by mode ('none', 'mjpeg' or 'file').
+
+    Returns:
+        PreviewSink: The sink, or None when previews are disabled.
+    """
+    options = dict(
+        render_fn=render_fn,
+        fps=settings.preview_fps,
+        max_width=settings.preview_max_width,
+        jpeg_quality=settings.preview_jpeg_quality,
+    )
+    if mode == "mjpeg":
+        return MJPEGPreviewServer(port=settings.preview_port, host=settings.preview_host, **options)
+    if mode == "file":
+        return FilePreviewSink(settings.preview_path, **options)
+    if mode in ("none", "", None):
+        return None
+    raise ValueError(f"Unknown preview mode: {mode!r}")
@@ -0,0 +1,297 @@
+"""
+Declarative incident rules, compiled into NumPy lookup tables.
+
+A rules file maps detector classes to incident types per camera, with
+per-class confidence thresholds, minimum box area, ROI polygons, minimum
+object counts and per-type cooldowns:
+
+    {
+      "defaults": {
+        "rules": [
+          {"classes": ["person"], "incident": "person_detected", "confidence": 0.6},
+          {"classes": ["car", "bus", "truck"], "incident": "traffic_congestion",
+           "min_count": 5, "min_box_area": 0.002, "cooldown_seconds": 120}
+        ],
+        "roi": [[[0.0, 0.4], [1.0, 0.4], [1.0, 1.0], [0.0, 1.0]]]
+      },
+      "cameras": {
+        "junction-3": {"roi": [[[0.2, 0.5], [0.8, 0.5], [0.8, 1.0], [0.2, 1.0]]]}
+      }
+    }
+
+A "confidence" (on a rule, or for all rules in "defaults" or a camera) is
+compared with the detection score, objectness x class confidence. Rules
+without one keep every detection the model returns, which already has
+objectness and class confidence each above the model threshold
+(CONFIDENCE_THRESHOLD, or the lowest rule confidence if that is lower), so
+the default rules built from COCO_TO_INCIDENT filter exactly like the model.
+
+Coordinates in ROI polygons and box areas are fractions of the frame, so a
+rule works unchanged at any camera resolution. A camera entry overrides the
+default keys it sets. Each rule may carry its own "roi"; otherwise the
+camera ROI applies, and no ROI means the whole frame.
+
+Cameras may also restrict and split what the detector sees:
+
+    "crop": [0.0, 0.3, 1.0, 1.0],  # [x1, y1, x2, y2] fractions, or "roi" for
+                                   # the bounding box of the camera ROI
+    "tiles": [3, 2],               # columns x rows of overlapping tiles
+    "tile_overlap": 0.2            # fraction of a tile shared with its neighbour
+
+Only the crop is run through the model, and with tiling each tile is
+inferred at full model resolution so small, distant objects survive.
+
+Compiled rules are evaluated on the detection arrays for a whole frame at
+once, so cost grows with detections rather than with the number of rules.
+"""
+import json
+import cv2
+import numpy as np
+
+# Resolution of the rasterized ROI masks (in cells across the frame)
+ROI_GRID_SIZE = 128
+
+
+def rasterize_roi(polygons, grid_size=ROI_GRID_SIZE):
+    """
+    Rasterize normalized ROI polygons into a boolean grid.
+
+    Args:
+        polygons (list): Polygons as lists of [x, y] points in [0, 1].
+        grid_size (int): Cells per side of the grid.
+
+    Returns:
+        np.ndarray: (grid_size, grid_size) mask; all True when polygons is empty.
+    """
+    if not polygons:
+        return np.ones((grid_size, grid_size), dtype=bool)
+    mask = np.zeros((grid_size, grid_size), dtype=np.uint8)
+    for polygon in polygons:
+        points = np.round(np.asarray(polygon, dtype=np.float32) * (grid_size - 1)).astype(np.int32)
+        cv2.fillPoly(mask, [points], 1)
+    return mask.astype(bool)
+
+
+def roi_bounds(polygons):
+    """Bounding box [x1, y1, x2, y2] of normalized ROI polygons, or None if there are none."""
+    if not polygons:
+        return None
+    points = np.concatenate([np.asarray(p, dtype=np.float32) for p in polygons])
+    x1, y1 = np.clip(points.min(axis=0), 0.0, 1.0)
+    x2, y2 = np.clip(points.max(axis=0), 0.0, 1.0)
+    return (float(x1), float(y1), float(x2), float(y2))
+
+
+def tile_windows(frame_size, crop=None, tiles=(1, 1), overlap=0.0):
+    """
+    Split the (cropped) frame into a grid of overlapping windows.
+
+    Args:
+        frame_size (tuple): (width, height) in pixels.
+        crop (tuple): (x1, y1, x2, y2) fractions of the frame, or None.
+        tiles (tuple): (columns, rows).
+        overlap (float): Fraction of a tile shared with each neighbour.
+
+    Returns:
+        list: (x1, y1, x2, y2) integer pixel windows.
+    """
+    w, h = frame_size
+    cx1, cy1, cx2, cy2 = crop or (0.0, 0.0, 1.0, 1.0)
+    left, top = int(round(cx1 * w)), int(round(cy1 * h))
+    right, bottom = int(round(cx2 * w)), int(round(cy2 * h))
+    cols, rows = tiles
+
+    def spans(start, end, count):
+        length = end - start
+        # count tiles of size t overlapping by overlap * t exactly cover length
+        size = length / (count - (count - 1) * overlap)
+        step = size * (1 - overlap)
+        return [
+            (start + int(round(i * step)), min(end, start + int(round(i * step + size))))
+            for i in range(count)
+        ]
+
+    return [
+        (x1, y1, x2, y2)
+        for y1, y2 in spans(top, bottom, rows)
+        for x1, x2 in spans(left, right, cols)
+    ]
+
+
+class CompiledRules:
+    """
+    Rules for one camera as lookup arrays indexed by class id and rule index.
+
+    Args:
+        rules (list): Rule dicts (see module docstring).
+        roi (list): Camera-wide ROI polygons.
+        class_names (list): Detector class names, indexed by class id.
+        default_confidence (float): Threshold for rules that do not set one.
+        check_default_confidence (bool): Also check the score of detections
+            under rules without their own confidence against default_confidence;
+            otherwise the model's pre-filter is all they get.
+        crop (list): [x1, y1, x2, y2] fractions inferred on, "roi", or None for the whole frame.
+        tiles (list): [columns, rows] of inference tiles within the crop.
+        tile_overlap (float): Overlap between neighbouring tiles as a fraction of a tile.
+    """
+
+    def __init__(self, rules, roi, class_names, default_confidence=0.5, check_default_confidence=True,
+                 crop=None, tiles=None, tile_overlap=0.2):
+        self.crop = roi_bounds(roi) if crop == "roi" else (tuple(float(v) for v in crop) if crop else None)
+        self.tiles = (int(tiles[0]), int(tiles[1])) if tiles else (1, 1)
+        self.tile_overlap = float(tile_overlap)
+        if self.crop is not None and not (0 <= self.crop[0] < self.crop[2] <= 1 and 0 <= self.crop[1] < self.crop[3] <= 1):
+            raise ValueError(f"Invalid crop {crop!r}: expected [x1, y1, x2, y2] fractions")
+        if min(self.tiles) < 1 or not 0 <= self.tile_overlap < 1:
+            raise ValueError("tiles must be >= 1 and tile_overlap in [0, 1)")
+        self._windows = {}
+
+        num_classes = len(class_names)
+        name_to_id = {name: idx for idx, name in enumerate(class_names)}
+
+        self.incident_types = []
+        self.class_rule = np.full(num_classes, -1, dtype=np.int64)
+        # class_threshold feeds the model's pre-filter (min_threshold);
+        # class_min_score is what evaluate() checks the product score against
+        self.class_threshold = np.ones(num_classes, dtype=np.float32)
+        self.class_min_score = np.zeros(num_classes, dtype=np.float32)
+        self.class_min_area = np.zeros(num_classes, dtype=np.float32)
+        min_counts, cooldowns, roi_masks = [], [], []
+
+        for rule_index, rule in enumerate(rules):
+            self.incident_types.append(rule["incident"])
+            min_counts.append(int(rule.get("min_count", 1)))
+            cooldowns.append(float(rule.get("cooldown_seconds", 0.0)))
+            roi_masks.append(rasterize_roi(rule.get("roi", roi)))
+            for cls in rule["classes"]:
+                class_id = name_to_id[cls] if isinstance(cls, str) else int(cls)
+                if self.class_rule[class_id] != -1:
+                    raise ValueError(f"Class {cls!r} is mapped by more than one rule")
+                self.class_rule[class_id] = rule_index
+                self.class_threshold[class_id] = float(rule.get("confidence", default_confidence))
+                if "confidence" in rule or check_default_confidence:
+                    self.class_min_score[class_id] = self.class_threshold[class_id]
+                self.class_min_area[class_id] = float(rule.get("min_box_area", 0.0))
+
+        self.min_count = np.array(min_counts, dtype=np.int64)
+        self.cooldown_seconds = np.array(cooldowns, dtype=np.float64)
+        self.roi_masks = (
+            np.stack(roi_masks) if roi_masks
+            else np.zeros((0, ROI_GRID_SIZE, ROI_GRID_SIZE), dtype=bool)
+        )
+
+    @property
+    def mapped_classes(self):
+        return np.flatnonzero(self.class_rule >= 0)
+
+    @property
+    def min_threshold(self):
+        mapped = self.mapped_classes
+        return float(self.class_threshold[mapped].min()) if len(mapped) else 1.0
+
+    def inference_windows(self, frame_shape):
+        """
+        Pixel windows (x1, y1, x2, y2) of the frame to run the detector on.
+
+        One window for the crop (the whole frame by default), or the
+        overlapping tiles covering it. Cached per frame size.
+        """
+        h, w = frame_shape[:2]
+        windows = self._windows.get((h, w))
+        if windows is None:
+            windows = tile_windows((w, h), self.crop, self.tiles, self.tile_overlap)
+            self._windows[(h, w)] = windows
+        return windows
+
+    def cooldown_for(self, incident_type):
+        indices = [i for i, t in enumerate(self.incident_types) if t == incident_type]
+        return float(self.cooldown_seconds[indices].max()) if indices else 0.0
+
+    def evaluate(self, detections, frame_shape):
+        """
+        Evaluate all rules against one frame's detections.
+
+        Args:
+            detections (Detections): boxes (N, 4) xyxy pixels, scores (N,), class_ids (N,).
+            frame_shape (tuple): Shape of the frame the boxes refer to.
+
+        Returns:
+            tuple: (mask, rule_index) where mask (N,) marks detections that satisfy
+                their rule and rule_index (N,) is the matching rule, -1 if unmapped.
+        """
+        boxes, scores, class_ids = detections
+        n = len(scores)
+        if n == 0 or len(self.incident_types) == 0:
+            return np.zeros(n, dtype=bool), np.full(n, -1, dtype=np.int64)
+
+        h, w = frame_shape[:2]
+        class_ids = np.clip(class_ids, 0, len(self.class_rule) - 1)
+        rule_index = self.class_rule[class_ids]
+        mask = rule_index >= 0
+        mask &= scores >= self.class_min_score[class_ids]
+
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) / float(w * h)
+        mask &= areas >= self.class_min_area[class_ids]
+
+        # ROI test on the bottom-centre of each box (where the object touches the ground)
+        grid = ROI_GRID_SIZE - 1
+        gx = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2 / w * grid).round().astype(np.int64), 0, grid)
+        gy = np.clip((boxes[:, 3] / h * grid).round().astype(np.int64), 0, grid)
+        safe_rule = np.where(mask, rule_index, 0)
+        mask &= self.roi_masks[safe_rule, gy, gx]
+
+        # Rules such as congestion need several qualifying objects in the frame
+        counts = np.bincount(rule_index[mask], minlength=len(self.incident_types))
+        mask &= counts[safe_rule] >= self.min_count[safe_rule]
+
+        return mask, rule_index
+
+
+class RuleSet:
+    """
+    Rules for all cameras, compiled once at startup.
+
+    Args:
+        config (dict): Parsed rules configuration.
+        class_names (list): Detector class names, indexed by class id.
+        default_confidence (float): Threshold for rules that do not set one.
+    """
+
+    def __init__(self, config, class_names, default_confidence=0.5):
+        self.defaults = config.get("defaults", {})
+        self.class_names = class_names
+        self.default_confidence = default_confidence
+        self.cameras = {}
+        for camera_id in config.get("cameras", {}):
+            self.cameras[camera_id] = self._compile(config["cameras"][camera_id])
+        self.default_rules = self._compile({})
+
+    def _compile(self, overrides):
+        merged = {**self.defaults, **overrides}
+        return CompiledRules(
+            merged.get("rules", []),
+            merged.get("roi"),
+            self.class_names,
+            default_confidence=merged.get("confidence", self.default_confidence),
+            check_default_confidence="confidence" in merged,
+            crop=merged.get("crop"),
+            tiles=merged.get("tiles"),
+            tile_overlap=merged.get("tile_overlap", 0.2),
+        )
+
+    def for_camera(self, camera_id):
+        return self.cameras.get(camera_id, self.default_rules)
+
+    @classmethod
+    def load(cls, path, class_names, default_confidence=0.5):
+        with open(path) as f:
+            return cls(json.load(f), class_names, default_confidence)
+
+    @classmethod
+    def from_class_map(cls, class_map, class_names, default_confidence=0.5):
+        """Build a rule set equivalent to a plain {class_id: incident_type} mapping."""
+        by_type = {}
+        for class_id, incident_type in class_map.items():
+            by_type.setdefault(incident_type, []).append(class_id)
+        rules = [{"classes": ids, "incident": t} for t, ids in by_type.items()]
+        return cls({"defaults": {"rules": rules}}, class_names, default_confidence)
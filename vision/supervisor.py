@@ -0,0 +1,391 @@
+"""
+Multi-process stream supervisor.
+
+Spawns one decode process per camera and a pool of inference processes.
+Decoded frames are written into per-camera ring buffers in
+multiprocessing.shared_memory, and only (camera, slot, sequence) tuples go
+through the queues, so frames are never pickled. Each camera is pinned to
+one inference process so its tracker state stays in one place.
+
+The supervisor restarts crashed workers, and decode workers reconnect
+dropped streams with exponential backoff.
+
+Usage:
+    CAMERA_STREAMS="gate=rtsp://...,junction-3=rtsp://..." python vision/supervisor.py
+"""
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import queue
+import signal
+import time
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+# Slot states in the shared header
+SLOT_FREE, SLOT_WRITING, SLOT_READY, SLOT_BUSY = 0, 1, 2, 3
+# Header fields per slot: state, sequence, height, width, timestamp (ms)
+HEADER_FIELDS = 5
+
+
+class FrameRing:
+    """
+    Fixed-size ring of frame slots in shared memory for one camera.
+
+    A single decode process writes and a single inference process reads.
+    The header lives in a lock-protected shared array; frame pixels live in
+    a SharedMemory block sized for max_height x max_width x 3.
+    """
+
+    def __init__(self, camera_id, slots, max_height, max_width, shm_name=None, header=None):
+        self.camera_id = camera_id
+        self.slots = slots
+        self.max_height = max_height
+        self.max_width = max_width
+        self.slot_bytes = max_height * max_width * 3
+        if shm_name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+            self.owner = True
+        else:
+            # Spawned workers share the supervisor's resource tracker, which
+            # only cleans up after the supervisor; the supervisor unlinks
+            self.shm = shared_memory.SharedMemory(name=shm_name)
+            self.owner = False
+        self.header = header if header is not None else mp.get_context('spawn').Array('q', slots * HEADER_FIELDS)
+        self._next_slot = 0
+        self._seq = 0
+
+    def spec(self):
+        """Arguments needed to attach to this ring from another process."""
+        return (self.camera_id, self.slots, self.max_height, self.max_width, self.shm.name, self.header)
+
+    @classmethod
+    def attach(cls, spec):
+        camera_id, slots, max_height, max_width, shm_name, header = spec
+        return cls(camera_id, slots, max_height, max_width, shm_name=shm_name, header=header)
+
+    def _slot_view(self, slot, height, width):
+        offset = slot * self.slot_bytes
+        return np.ndarray((height, width, 3), dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    def write(self, frame, timestamp_ms):
+        """
+        Copy a frame into the next free slot.
+
+        Returns:
+            tuple: (slot, seq), or None if every slot is still in use (frame dropped).
+        """
+        height, width = frame.shape[:2]
+        for i in range(self.slots):
+            slot = (self._next_slot + i) % self.slots
+            base = slot * HEADER_FIELDS
+            with self.header.get_lock():
+                if self.header[base] != SLOT_FREE:
+                    continue
+                self.header[base] = SLOT_WRITING
+            self._slot_view(slot, height, width)[:] = frame
+            self._seq += 1
+            with self.header.get_lock():
+                self.header[base + 1] = self._seq
+                self.header[base + 2] = height
+                self.header[base + 3] = width
+                self.header[base + 4] = timestamp_ms
+                self.header[base] = SLOT_READY
+            self._next_slot = (slot + 1) % self.slots
+            return slot, self._seq
+        return None
+
+    def acquire(self, slot, seq):
+        """
+        Claim a ready slot for reading.
+
+        Returns:
+            tuple: (frame_view, timestamp_ms), or None if the slot was recycled.
+        """
+        base = slot * HEADER_FIELDS
+        with self.header.get_lock():
+            if self.header[base] != SLOT_READY or self.header[base + 1] != seq:
+                return None
+            self.header[base] = SLOT_BUSY
+            height, width, timestamp_ms = self.header[base + 2], self.header[base + 3], self.header[base + 4]
+        return self._slot_view(slot, height, width), timestamp_ms
+
+    def release(self, slot):
+        with self.header.get_lock():
+            self.header[slot * HEADER_FIELDS] = SLOT_FREE
+
+    def reset_reader_slots(self):
+        """Free slots held by a reader that died, so the writer can reuse them."""
+        with self.header.get_lock():
+            for slot in range(self.slots):
+                if self.header[slot * HEADER_FIELDS] in (SLOT_READY, SLOT_BUSY):
+                    self.header[slot * HEADER_FIELDS] = SLOT_FREE
+
+    def reset_writer_slots(self):
+        """Free a slot left half-written by a writer that died."""
+        with self.header.get_lock():
+            for slot in range(self.slots):
+                if self.header[slot * HEADER_FIELDS] == SLOT_WRITING:
+                    self.header[slot * HEADER_FIELDS] = SLOT_FREE
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def fit_frame(frame, max_height, max_width):
+    """Downscale a frame that doesn't fit the ring's slot size."""
+    import cv2
+    height, width = frame.shape[:2]
+    if height <= max_height and width <= max_width:
+        return frame
+    scale = min(max_height / height, max_width / width)
+    return cv2.resize(frame, (int(width * scale), int(height * scale)))
+
+
+def decode_worker(ring_spec, stream_url, out_queue, stop_event):
+    """Read frames from a stream into the camera's ring, reconnecting with backoff."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import metrics
+    ring = FrameRing.attach(ring_spec)
+    camera_id = ring.camera_id
+    from vision.capture import open_capture, load_capture_options
+    capture_options = load_capture_options(camera_id)
+    backoff = 1.0
+    dropped = 0
+    try:
+        while not stop_event.is_set():
+            cap = open_capture(stream_url, capture_options)
+            if not cap.isOpened():
+                print(f"[{camera_id}] Unable to open stream, retrying in {backoff:.0f}s")
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, settings.stream_reconnect_max_backoff)
+                continue
+
+            print(f"[{camera_id}] Stream opened: {stream_url} ({capture_options['backend']})")
+            while not stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    print(f"[{camera_id}] Stream read failed, reconnecting")
+                    break
+                backoff = 1.0
+                metrics.FRAMES_READ.labels(camera=camera_id).inc()
+                frame = fit_frame(frame, ring.max_height, ring.max_width)
+                written = ring.write(frame, int(time.time() * 1000))
+                if written is None:
+                    # Inference is behind; dropping keeps latency bounded
+                    metrics.FRAMES_DROPPED.labels(camera=camera_id).inc()
+                    dropped += 1
+                    if dropped % 100 == 1:
+                        print(f"[{camera_id}] Inference behind, dropped {dropped} frames so far")
+                    continue
+                out_queue.put((camera_id, *written))
+            cap.release()
+            if not stop_event.is_set():
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, settings.stream_reconnect_max_backoff)
+    finally:
+        ring.close()
+
+
+def inference_worker(ring_specs, in_queue, stop_event):
+    """Run the model and incident logic for the cameras pinned to this worker."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from datetime import datetime, timezone
+    from storage.minio_client import create_bucket_if_not_exists
+    from vision.yolov11_pipeline import YOLOv11Nano, StreamProcessor, load_rules, open_detection_log
+
+    rings = {spec[0]: FrameRing.attach(spec) for spec in ring_specs}
+    rules = load_rules()
+    model = YOLOv11Nano(
+        model_path=settings.yolo_model_path,
+        confidence_threshold=min(
+            [settings.confidence_threshold] + [rules.for_camera(c).min_threshold for c in rings]
+        )
+    )
+    processors = {
+        camera_id: StreamProcessor(camera_id=camera_id, rules=rules, detection_log=open_detection_log(camera_id))
+        for camera_id in rings
+    }
+    create_bucket_if_not_exists(settings.minio_bucket)
+    print(f"Inference worker ready for cameras: {', '.join(rings)}")
+
+    try:
+        while not stop_event.is_set():
+            try:
+                camera_id, slot, seq = in_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            ring = rings[camera_id]
+            acquired = ring.acquire(slot, seq)
+            if acquired is None:
+                continue
+            frame, timestamp_ms = acquired
+            try:
+                processor = processors[camera_id]
+                detections = model.detect(frame, processor.rules.inference_windows(frame.shape))
+                processor.process_frame(
+                    frame, detections, datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+                )
+            finally:
+                # Drop the view before the slot can be rewritten or the block closed
+                del frame
+                ring.release(slot)
+    finally:
+        for processor in processors.values():
+            if processor.detection_log is not None:
+                processor.detection_log.close()
+        for ring in rings.values():
+            ring.close()
+
+
+def parse_camera_streams(value):
+    """Parse "id=url,id=url" into a dict; falls back to the single configured stream."""
+    cameras = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        camera_id, _, url = item.partition("=")
+        if not url:
+            raise ValueError(f"Expected camera_id=url, got {item!r}")
+        cameras[camera_id.strip()] = url.strip()
+    return cameras or {settings.camera_id: settings.stream_url}
+
+
+class Supervisor:
+    """
+    Owns the shared memory, starts the workers and restarts the ones that die.
+
+    Args:
+        cameras (dict): camera_id -> stream URL.
+        inference_workers (int): Number of inference processes.
+    """
+
+    def __init__(self, cameras, inference_workers=1):
+        self.ctx = mp.get_context('spawn')
+        self.cameras = cameras
+        self.stop_event = self.ctx.Event()
+        self.rings = {
+            camera_id: FrameRing(
+                camera_id,
+                settings.shm_slots_per_camera,
+                settings.shm_max_frame_height,
+                settings.shm_max_frame_width,
+            )
+            for camera_id in cameras
+        }
+
+        worker_count = max(1, min(inference_workers, len(cameras)))
+        self.assignments = {i: [] for i in range(worker_count)}
+        for idx, camera_id in enumerate(cameras):
+            self.assignments[idx % worker_count].append(camera_id)
+        # Unbounded is safe: outstanding messages are limited by the ring slots
+        self.queues = {i: self.ctx.Queue() for i in self.assignments}
+        self.camera_queue = {
+            camera_id: self.queues[i] for i, cams in self.assignments.items() for camera_id in cams
+        }
+        self.processes = {}
+        self.restarts = {}
+        # Dead workers waiting out their restart backoff: key -> monotonic time
+        self.next_restart_at = {}
+
+    def _spawn(self, key):
+        kind, ident = key
+        if kind == "decode":
+            target = decode_worker
+            args = (self.rings[ident].spec(), self.cameras[ident], self.camera_queue[ident], self.stop_event)
+        else:
+            target = inference_worker
+            specs = [self.rings[c].spec() for c in self.assignments[ident]]
+            args = (specs, self.queues[ident], self.stop_event)
+        process = self.ctx.Process(target=target, args=args, name=f"{kind}-{ident}", daemon=True)
+        process.start()
+        self.processes[key] = process
+
+    def _handle_exit(self, key):
+        """Free the dead worker's slots and schedule its restart."""
+        kind, ident = key
+        self.restarts[key] = self.restarts.get(key, 0) + 1
+        # Back off on repeated crashes so a bad config doesn't spin; the
+        # other workers keep being monitored in the meantime
+        delay = min(2 ** min(self.restarts[key], 5), settings.stream_reconnect_max_backoff)
+        print(f"Worker {kind}-{ident} exited (code {self.processes[key].exitcode}); "
+              f"restart #{self.restarts[key]} in {delay:.0f}s")
+        # The rings stay owned by the supervisor and are reused by the
+        # restarted worker; only the slots the dead one held are freed
+        if kind == "inference":
+            for camera_id in self.assignments[ident]:
+                self.rings[camera_id].reset_reader_slots()
+        else:
+            self.rings[ident].reset_writer_slots()
+        self.next_restart_at[key] = time.monotonic() + delay
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for key, process in list(self.processes.items()):
+            if key in self.next_restart_at:
+                if now >= self.next_restart_at[key]:
+                    del self.next_restart_at[key]
+                    self._spawn(key)
+            elif not process.is_alive():
+                self._handle_exit(key)
+
+    def run(self):
+        keys = [("inference", i) for i in self.assignments] + [("decode", c) for c in self.cameras]
+        for key in keys:
+            self._spawn(key)
+        print(f"Supervisor started {len(self.cameras)} decode and {len(self.assignments)} inference workers")
+        try:
+            while not self.stop_event.is_set():
+                self._check_workers()
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            print("\nShutting down supervisor...")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop the workers and unlink the shared memory, which only the supervisor owns."""
+        self.stop_event.set()
+        try:
+            for process in self.processes.values():
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join(timeout=5)
+        finally:
+            for ring in self.rings.values():
+                ring.close()
+
+
+def enable_multiprocess_metrics():
+    """
+    Point every process at a shared metrics directory and start the exporter.
+
+    Must run before metrics is imported anywhere; spawned workers inherit the
+    environment variable and write their samples to the same directory.
+    """
+    import shutil
+    import tempfile
+    metrics_dir = os.path.join(tempfile.gettempdir(), f"vision-metrics-{os.getpid()}")
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    import metrics
+    metrics.start_metrics_server(settings.vision_metrics_port)
+
+
+if __name__ == "__main__":
+    enable_multiprocess_metrics()
+    supervisor = Supervisor(
+        parse_camera_streams(settings.camera_streams),
+        inference_workers=settings.inference_workers,
+    )
+    supervisor.run()
@@ -0,0 +1,169 @@
+"""
+Lightweight multi-object tracker for the vision pipeline.
+
+Detections are associated to existing tracks by IoU (with a centroid-distance
+fallback for fast movers) using NumPy over the whole frame at once. An
+incident is triggered at most once per track, once it has been seen often enough,
+so a parked car or a standing person produces one incident instead of one
+every few seconds.
+"""
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise IoU between two sets of xyxy boxes.
+
+    Args:
+        boxes_a (np.ndarray): (N, 4) boxes.
+        boxes_b (np.ndarray): (M, 4) boxes.
+
+    Returns:
+        np.ndarray: (N, M) IoU values.
+    """
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def _greedy_match(scores, valid):
+    """Greedily pick (row, col) pairs with the highest scores among valid entries."""
+    matches = []
+    if scores.size == 0:
+        return matches
+    scores = np.where(valid, scores, -np.inf)
+    order = np.argsort(-scores, axis=None)
+    used_rows, used_cols = set(), set()
+    for flat in order:
+        row, col = divmod(int(flat), scores.shape[1])
+        if not np.isfinite(scores[row, col]):
+            break
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matches.append((row, col))
+    return matches
+
+
+class Track:
+    """A single tracked object."""
+
+    def __init__(self, track_id, box, class_id, score, timestamp):
+        self.track_id = track_id
+        self.box = box
+        self.class_id = class_id
+        self.score = score
+        self.best_score = score
+        self.hits = 1
+        self.missed = 0
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.fired = False
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker with persistence-based triggering.
+
+    Args:
+        iou_threshold (float): Minimum IoU to associate a detection with a track.
+        centroid_threshold (float): Fallback association when the centroid moved
+            less than this fraction of the track's box diagonal.
+        min_hits (int): Frames a track must be seen before it triggers.
+        max_missed (int): Consecutive frames a track may be missing before removal.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_threshold=1.0, min_hits=5, max_missed=15):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.min_hits = min_hits
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def _associate(self, boxes, class_ids):
+        if not self.tracks or len(boxes) == 0:
+            return [], list(range(len(self.tracks))), list(range(len(boxes)))
+
+        track_boxes = np.array([t.box for t in self.tracks], dtype=np.float32)
+        track_classes = np.array([t.class_id for t in self.tracks])
+        same_class = track_classes[:, None] == class_ids[None, :]
+
+        ious = iou_matrix(track_boxes, boxes)
+        matches = _greedy_match(ious, same_class & (ious >= self.iou_threshold))
+
+        matched_rows = {r for r, _ in matches}
+        matched_cols = {c for _, c in matches}
+        rows = [r for r in range(len(self.tracks)) if r not in matched_rows]
+        cols = [c for c in range(len(boxes)) if c not in matched_cols]
+
+        if rows and cols and self.centroid_threshold > 0:
+            # Second pass for objects that moved too far for any overlap
+            tb = track_boxes[rows]
+            db = boxes[cols]
+            tc = (tb[:, :2] + tb[:, 2:]) / 2
+            dc = (db[:, :2] + db[:, 2:]) / 2
+            dist = np.linalg.norm(tc[:, None, :] - dc[None, :, :], axis=2)
+            diag = np.linalg.norm(tb[:, 2:] - tb[:, :2], axis=1)
+            valid = same_class[np.ix_(rows, cols)] & (dist < self.centroid_threshold * diag[:, None])
+            for r, c in _greedy_match(-dist, valid):
+                matches.append((rows[r], cols[c]))
+            matched_rows = {r for r, _ in matches}
+            matched_cols = {c for _, c in matches}
+            rows = [r for r in range(len(self.tracks)) if r not in matched_rows]
+            cols = [c for c in range(len(boxes)) if c not in matched_cols]
+
+        return matches, rows, cols
+
+    def update(self, boxes, scores, class_ids, timestamp):
+        """
+        Advance the tracker by one frame.
+
+        Args:
+            boxes (np.ndarray): (N, 4) xyxy detection boxes.
+            scores (np.ndarray): (N,) detection scores.
+            class_ids (np.ndarray): (N,) detection class ids.
+            timestamp (datetime): Frame timestamp.
+
+        Returns:
+            list: Confirmed tracks (seen on this frame, at least min_hits times)
+                that have not fired yet. The caller sets track.fired once an
+                incident was actually raised, so a track held back (e.g. by a
+                cooldown) is offered again on later frames.
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        class_ids = np.asarray(class_ids)
+        matches, unmatched_tracks, unmatched_dets = self._associate(boxes, class_ids)
+
+        for row, col in matches:
+            track = self.tracks[row]
+            track.box = boxes[col]
+            track.score = float(scores[col])
+            track.best_score = max(track.best_score, track.score)
+            track.hits += 1
+            track.missed = 0
+            track.last_seen = timestamp
+
+        for row in unmatched_tracks:
+            self.tracks[row].missed += 1
+
+        for col in unmatched_dets:
+            self.tracks.append(Track(
+                self._next_id, boxes[col], int(class_ids[col]), float(scores[col]), timestamp
+            ))
+            self._next_id += 1
+
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        triggered = []
+        for track in self.tracks:
+            if not track.fired and track.missed == 0 and track.hits >= self.min_hits:
+                triggered.append(track)
+        return triggered
@@ -1,10 +1,9 @@
 import cv2
 import numpy as np
 import onnxruntime as ort
-from datetime import datetime
+from datetime import datetime, timezone
 import redis
-import json
-from collections import deque
+from collections import deque, namedtuple
 import io
 import sys
 import os
@@ -14,6 +13,13 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
 from storage.minio_client import upload_frame, create_bucket_if_not_exists
+from vision.tracker import IoUTracker
+from vision.rules import RuleSet
+from vision.preview import create_preview_sink
+from vision.capture import open_capture, load_capture_options
+from vision.detection_log import DetectionLogWriter
+import metrics
+from event_schema import encode_event
 
 # COCO class names (YOLOv8 uses COCO dataset with 80 classes)
 COCO_CLASSES = [
@@ -29,7 +35,8 @@ COCO_CLASSES = [
     'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush'
 ]
 
-# Map COCO classes to incident types (for demo purposes)
+# Map COCO classes to incident types (for demo purposes). Used as the rule set
+# when no rules file is configured; see vision/rules.py for the full format.
 COCO_TO_INCIDENT = {
     0: "person_detected",  # person - will trigger incident
     2: "traffic_congestion",  # car
@@ -40,38 +47,261 @@ COCO_TO_INCIDENT = {
     67: "cell_phone_detected",  # cell phone (for testing)
 }
 
+# Detections for one frame as parallel arrays: boxes are (N, 4) xyxy in
+# frame pixel coordinates, scores (N,) and class_ids (N,)
+Detections = namedtuple('Detections', ['boxes', 'scores', 'class_ids'])
+
+def empty_detections():
+    return Detections(
+        np.zeros((0, 4), dtype=np.float32),
+        np.zeros(0, dtype=np.float32),
+        np.zeros(0, dtype=np.int64)
+    )
+
+# Execution providers in order of preference; only installed ones are used
+PREFERRED_PROVIDERS = [
+    'CUDAExecutionProvider',
+    'OpenVINOExecutionProvider',
+    'XnnpackExecutionProvider',
+    'CPUExecutionProvider',
+]
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+def select_providers(requested=None):
+    """
+    Pick execution providers that are actually available in this install.
+
+    Args:
+        requested (list): Provider names in order of preference, or None for the defaults.
+    """
+    available = ort.get_available_providers()
+    wanted = requested or PREFERRED_PROVIDERS
+    missing = [p for p in wanted if p not in available]
+    if requested and missing:
+        print(f"Warning: execution providers not available: {', '.join(missing)}")
+    providers = [p for p in wanted if p in available]
+    return providers or ['CPUExecutionProvider']
+
+def build_session_options():
+    """Build ONNX Runtime session options from settings."""
+    options = ort.SessionOptions()
+    if settings.ort_intra_op_threads > 0:
+        options.intra_op_num_threads = settings.ort_intra_op_threads
+    if settings.ort_inter_op_threads > 0:
+        options.inter_op_num_threads = settings.ort_inter_op_threads
+    options.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if settings.ort_execution_mode == 'parallel'
+        else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[settings.ort_graph_optimization]
+    return options
+
+# Providers whose optimized graph can be saved as plain ONNX; compiled-node
+# providers (OpenVINO, TensorRT, ...) cannot serialize their fused nodes
+CACHEABLE_PROVIDERS = {'CPUExecutionProvider', 'CUDAExecutionProvider'}
+
+def optimized_model_cache_path(model_path, providers, optimization_level):
+    """
+    Location of the cached optimized graph for this model, providers,
+    optimization level and ORT version, or None if caching is off or unsupported.
+
+    Optimizations can be provider specific, so each combination gets its own file.
+    """
+    if not settings.ort_optimized_model_dir or not set(providers) <= CACHEABLE_PROVIDERS:
+        return None
+    stem = Path(model_path).stem
+    provider_tag = '-'.join(p.replace('ExecutionProvider', '').lower() for p in providers)
+    level = {v: k for k, v in GRAPH_OPTIMIZATION_LEVELS.items()}.get(optimization_level, str(optimization_level))
+    file_name = f"{stem}.{provider_tag}.{level}.ort-{ort.__version__}.onnx"
+    return str(Path(settings.ort_optimized_model_dir) / file_name)
+
+def create_session(model_path, providers, options):
+    """
+    Create an InferenceSession, reusing or writing the optimized graph cache.
+
+    The caller's options are restored afterwards, and any failure to load or
+    save the cache falls back to a plain session on the original model.
+
+    Returns:
+        tuple: (session, path actually loaded)
+    """
+    cache_path = optimized_model_cache_path(model_path, providers, options.graph_optimization_level)
+    if not cache_path:
+        return ort.InferenceSession(model_path, sess_options=options, providers=providers), model_path
+
+    saved_level = options.graph_optimization_level
+    saved_filepath = options.optimized_model_filepath
+    try:
+        # Reuse a previously optimized graph instead of re-optimizing on every start
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(model_path):
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            load_path = cache_path
+        else:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            options.optimized_model_filepath = cache_path
+            load_path = model_path
+        try:
+            return ort.InferenceSession(load_path, sess_options=options, providers=providers), load_path
+        except Exception as e:
+            print(f"Warning: optimized model cache unusable ({e}); loading {model_path} without it")
+            if os.path.exists(cache_path):
+                # Regenerated on the next start rather than failing every time
+                os.remove(cache_path)
+    finally:
+        options.graph_optimization_level = saved_level
+        options.optimized_model_filepath = saved_filepath
+    return ort.InferenceSession(model_path, sess_options=options, providers=providers), model_path
+
+# ONNX tensor element types to NumPy dtypes (FP16 variants take half inputs)
+ONNX_INPUT_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(float16)': np.float16,
+}
+
+def preprocess_frame(frame, input_size=(640, 640), dtype=np.float32):
+    """Resize, scale to [0, 1] and convert an HWC BGR frame to a 1xCxHxW tensor."""
+    resized = cv2.resize(frame, input_size)
+    normalized = resized / 255.0
+    transposed = np.transpose(normalized, (2, 0, 1))
+    return np.expand_dims(transposed, axis=0).astype(dtype)
+
+def nms_per_class(detections, iou_threshold=0.5):
+    """Class-wise non-maximum suppression over Detections in frame coordinates."""
+    boxes, scores, class_ids = detections
+    if len(scores) < 2:
+        return detections
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+    keep = cv2.dnn.NMSBoxesBatched(
+        xywh.tolist(), scores.tolist(), class_ids.astype(np.int32).tolist(), 0.0, iou_threshold
+    )
+    keep = np.sort(np.asarray(keep, dtype=np.int64).reshape(-1))
+    return Detections(boxes[keep], scores[keep], class_ids[keep])
+
 # Load YOLOv11-Nano model
 class YOLOv11Nano:
-    def __init__(self, model_path, input_size=(640, 640), confidence_threshold=0.5):
-        self.session = ort.InferenceSession(model_path, providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
-        self.input_name = self.session.get_inputs()[0].name
+    def __init__(self, model_path, input_size=(640, 640), confidence_threshold=0.5,
+                 providers=None, session_options=None, warmup_runs=None):
+        providers = select_providers(providers or settings.ort_providers_list)
+        options = session_options or build_session_options()
+        
+        self.session, load_path = create_session(model_path, providers, options)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = ONNX_INPUT_DTYPES.get(model_input.type, np.float32)
+        # Models exported with a dynamic batch axis take all tiles in one run
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
         self.input_size = input_size
         self.confidence_threshold = confidence_threshold
+        print(f"Loaded {load_path} with providers: {', '.join(self.session.get_providers())}")
+        
+        self.warmup(settings.ort_warmup_runs if warmup_runs is None else warmup_runs)
+
+    def warmup(self, runs=1):
+        """Run dummy inferences so the first real frame doesn't pay allocation/kernel setup cost."""
+        if runs <= 0:
+            return
+        dummy = np.zeros((1, 3, self.input_size[1], self.input_size[0]), dtype=self.input_dtype)
+        for _ in range(runs):
+            self.session.run(None, {self.input_name: dummy})
 
     def preprocess(self, frame):
-        resized = cv2.resize(frame, self.input_size)
-        normalized = resized / 255.0
-        transposed = np.transpose(normalized, (2, 0, 1))
-        return np.expand_dims(transposed, axis=0).astype(np.float32)
+        return preprocess_frame(frame, self.input_size, self.input_dtype)
 
-    def postprocess(self, outputs):
-        detections = []
+    def preprocess_windows(self, frame, windows):
+        """Preprocess each (x1, y1, x2, y2) window of frame into one NxCxHxW batch."""
+        return np.concatenate([
+            self.preprocess(frame[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows
+        ])
+
+    def run_batch(self, batch):
+        """Run a preprocessed batch; one session.run when the model has a dynamic batch axis."""
+        if self.dynamic_batch or len(batch) == 1:
+            return self.session.run(None, {self.input_name: batch})
+        outputs = [self.session.run(None, {self.input_name: batch[i:i + 1]}) for i in range(len(batch))]
+        return [np.concatenate([out[0] for out in outputs])]
+
+    def postprocess_windows(self, outputs, windows, iou_threshold=0.5):
+        """Map detections from every window back to frame pixels, merging tile overlaps with NMS."""
+        boxes, scores, class_ids = [], [], []
+        for index, (x1, y1, x2, y2) in enumerate(windows):
+            window_boxes, window_scores, window_class_ids = self.postprocess_arrays(outputs, index)
+            offset = np.array([x1, y1, x1, y1], dtype=np.float32)
+            boxes.append(self.to_frame_boxes(window_boxes, (y2 - y1, x2 - x1)) + offset)
+            scores.append(window_scores)
+            class_ids.append(window_class_ids)
+        detections = Detections(np.concatenate(boxes), np.concatenate(scores), np.concatenate(class_ids))
+        if len(windows) > 1:
+            detections = nms_per_class(detections, iou_threshold)
+        return detections
+
+    def postprocess_arrays(self, outputs, index=0):
+        """
+        Vectorized postprocessing of raw model outputs.
+
+        Args:
+            outputs (list): Raw session outputs.
+            index (int): Batch item to decode.
+
+        Returns:
+            tuple: (boxes, scores, class_ids) with boxes as (N, 4) xywh in model input space.
+        """
         # Assuming YOLOv11 output format: [batch, num_detections, 85]
         # [x, y, w, h, confidence, class_scores...]
-        for output in outputs[0][0]:
-            confidence = output[4]
-            if confidence > self.confidence_threshold:
-                class_scores = output[5:]
-                class_id = np.argmax(class_scores)
-                class_confidence = class_scores[class_id]
-                
-                if class_confidence > self.confidence_threshold:
-                    detections.append({
-                        'class_id': int(class_id),
-                        'confidence': float(confidence * class_confidence),
-                        'bbox': output[:4].tolist()
-                    })
-        return detections
+        predictions = outputs[0][index].astype(np.float32, copy=False)
+        objectness = predictions[:, 4]
+        class_scores = predictions[:, 5:]
+        class_ids = np.argmax(class_scores, axis=1)
+        class_confidence = class_scores[np.arange(len(class_ids)), class_ids]
+
+        keep = (objectness > self.confidence_threshold) & (class_confidence > self.confidence_threshold)
+        return (
+            predictions[keep, :4],
+            (objectness[keep] * class_confidence[keep]).astype(np.float32),
+            class_ids[keep]
+        )
+
+    def postprocess(self, outputs):
+        boxes, scores, class_ids = self.postprocess_arrays(outputs)
+        return [
+            {
+                'class_id': int(class_id),
+                'confidence': float(score),
+                'bbox': box.tolist()
+            }
+            for box, score, class_id in zip(boxes, scores, class_ids)
+        ]
+
+    def to_frame_boxes(self, boxes, frame_shape):
+        """Convert xywh boxes in model input space to xyxy frame pixel coordinates."""
+        h, w = frame_shape[:2]
+        scale = np.array(
+            [w / self.input_size[0], h / self.input_size[1]] * 2, dtype=np.float32
+        )
+        xyxy = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1)
+        return (xyxy * scale).astype(np.float32)
+
+    def detect(self, frame, windows=None):
+        """
+        Run inference and return Detections in frame pixel coordinates.
+
+        Args:
+            frame (np.ndarray): BGR frame.
+            windows (list): (x1, y1, x2, y2) regions to infer on, e.g. a crop or
+                tiles from CompiledRules.inference_windows(); None for the whole frame.
+        """
+        with metrics.INFERENCE_LATENCY.time():
+            if windows is None:
+                h, w = frame.shape[:2]
+                windows = [(0, 0, w, h)]
+            batch = self.preprocess_windows(frame, windows)
+            outputs = self.run_batch(batch)
+            return self.postprocess_windows(outputs, windows)
 
     def infer(self, frame):
         input_tensor = self.preprocess(frame)
@@ -109,145 +339,247 @@ redis_client = redis.StrictRedis(
 )
 
 def upload_frames_to_minio(frames, incident_id):
-    """Upload frames to MinIO and return URLs"""
-    frame_urls = []
+    """Upload frames to MinIO and return their object keys"""
+    frame_keys = []
     
     for idx, frame in enumerate(frames):
-        # Encode frame as JPEG
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = io.BytesIO(buffer.tobytes())
-        
-        # Upload to MinIO
-        file_name = f"{incident_id}_f{idx+1}.jpg"
-        url = upload_frame(settings.minio_bucket, file_name, frame_bytes)
+        with metrics.UPLOAD_LATENCY.time():
+            # Encode frame as JPEG
+            _, buffer = cv2.imencode('.jpg', frame)
+            frame_bytes = io.BytesIO(buffer.tobytes())
+            
+            # Upload to MinIO
+            file_name = f"{incident_id}_f{idx+1}.jpg"
+            url = upload_frame(settings.minio_bucket, file_name, frame_bytes)
+        metrics.UPLOAD_BYTES.inc(len(buffer))
         
         if url:
-            frame_urls.append(url)
+            frame_keys.append(file_name)
     
-    return frame_urls
+    return frame_keys
+
+def publish_event(event):
+    """Publish an incident event to the Redis 'events' channel."""
+    redis_client.publish('events', encode_event(event))
+
+def class_name_for(class_id):
+    return COCO_CLASSES[class_id] if class_id < len(COCO_CLASSES) else f"class_{class_id}"
+
+def load_rules():
+    """Load the configured rules file, or fall back to COCO_TO_INCIDENT."""
+    if settings.rules_config_path:
+        return RuleSet.load(settings.rules_config_path, COCO_CLASSES, settings.confidence_threshold)
+    return RuleSet.from_class_map(COCO_TO_INCIDENT, COCO_CLASSES, settings.confidence_threshold)
+
+def open_detection_log(camera_id):
+    """Detection log writer for a camera, or None when DETECTION_LOG_DIR is unset."""
+    if not settings.detection_log_dir:
+        return None
+    return DetectionLogWriter(
+        settings.detection_log_dir,
+        camera_id,
+        chunk_frames=settings.detection_log_chunk_frames,
+        chunk_seconds=settings.detection_log_chunk_seconds
+    )
+
+class StreamProcessor:
+    """
+    Per-camera incident logic: frame buffer, rules, tracker and publishing.
+
+    Detections are filtered by the camera's compiled rules, and incidents
+    are triggered per tracked object once it has persisted for
+    track_min_hits frames, subject to the rule's per-type cooldown.
+
+    Args:
+        camera_id (str): Camera whose rules apply.
+        rules (RuleSet): Compiled rules; loaded from settings if omitted.
+        upload_fn (callable): Uploads frames for an incident, returns object keys.
+        publish_fn (callable): Publishes an event dict.
+        detection_log (DetectionLogWriter): Records every frame's detections, if set.
+    """
+
+    def __init__(self, camera_id="default", rules=None, upload_fn=upload_frames_to_minio, publish_fn=publish_event,
+                 detection_log=None):
+        self.camera_id = camera_id
+        self.rules = (rules or load_rules()).for_camera(camera_id)
+        self.upload_fn = upload_fn
+        self.publish_fn = publish_fn
+        self.frame_buffer = FrameBuffer(max_size=settings.frame_buffer_size)
+        self.tracker = IoUTracker(
+            iou_threshold=settings.track_iou_threshold,
+            min_hits=settings.track_min_hits,
+            max_missed=settings.track_max_missed
+        )
+        self.last_fired = {}
+        self.detection_log = detection_log
+
+    def process_frame(self, frame, detections, timestamp):
+        """
+        Apply rules, update tracks and fire incidents for newly confirmed tracks.
+
+        Returns:
+            list: Events published for this frame.
+        """
+        self.frame_buffer.add_frame(frame, timestamp)
+        if self.detection_log is not None:
+            self.detection_log.append(timestamp, frame.shape, detections)
+
+        metrics.DETECTIONS_PER_FRAME.labels(camera=self.camera_id).observe(len(detections.scores))
+        mask, _ = self.rules.evaluate(detections, frame.shape)
+        triggered = self.tracker.update(
+            detections.boxes[mask], detections.scores[mask], detections.class_ids[mask], timestamp
+        )
+
+        # At most one incident per type per frame; keep the most confident track
+        by_type = {}
+        for track in triggered:
+            incident_type = self.rules.incident_types[self.rules.class_rule[track.class_id]]
+            if incident_type not in by_type or track.best_score > by_type[incident_type].best_score:
+                by_type[incident_type] = track
+
+        events = []
+        for incident_type, track in by_type.items():
+            last = self.last_fired.get(incident_type)
+            cooldown = self.rules.cooldown_for(incident_type)
+            if last is not None and (timestamp - last).total_seconds() < cooldown:
+                continue
+            event = self.fire_incident(incident_type, track, timestamp)
+            if event:
+                # Only now; tracks held back above are offered again next frame
+                track.fired = True
+                self.last_fired[incident_type] = timestamp
+                events.append(event)
+        return events
+
+    def fire_incident(self, incident_type, track, timestamp):
+        confidence = track.best_score
+        metrics.INCIDENTS_FIRED.labels(camera=self.camera_id, incident_type=incident_type).inc()
+        print(f"\n🚨 INCIDENT DETECTED: {class_name_for(track.class_id)} -> {incident_type} "
+              f"(track {track.track_id}, confidence: {confidence:.2f})")
+
+        incident_id = f"incident_{timestamp.strftime('%Y%m%d%H%M%S%f')}_{track.track_id}"
+
+        # Extract spaced frames from buffer
+        selected_frames, _ = self.frame_buffer.get_spaced_frames(
+            num_frames=settings.frames_to_extract,
+            spacing_ms=200
+        )
+
+        # Upload frames to MinIO
+        print(f"Uploading {len(selected_frames)} frames to MinIO...")
+        frame_keys = self.upload_fn(selected_frames, incident_id)
+        if not frame_keys:
+            return None
+
+        # Create event payload
+        event = {
+            "id": incident_id,
+            "incident": incident_type,
+            "confidence": float(confidence),
+            "frames": frame_keys,
+            "timestamp": timestamp,
+            "location": {
+                "lat": settings.default_lat,
+                "lon": settings.default_lon
+            },
+            "camera_id": self.camera_id
+        }
+
+        # Publish to Redis
+        self.publish_fn(event)
+        print(f"Event published to Redis: {incident_id}")
+        return event
+
+def draw_detections(frame, detections, frame_count):
+    """Draw boxes, labels and the info overlay onto frame in place."""
+    for box, score, class_id in zip(detections.boxes, detections.scores, detections.class_ids):
+        x1, y1, x2, y2 = box.astype(int)
+        class_name = class_name_for(int(class_id))
+
+        # Draw rectangle and label
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f"{class_name}: {score:.2f}"
+        cv2.putText(frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+    # Add info overlay
+    cv2.putText(frame, f"Detections: {len(detections.scores)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    cv2.putText(frame, f"Frame: {frame_count}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
 
 # Process video stream
-def process_stream(stream_url, model):
-    # Convert string to int for webcam device ID
-    if isinstance(stream_url, str) and stream_url.isdigit():
-        stream_url = int(stream_url)
+def process_stream(stream_url, model, camera_id="default", rules=None, headless=None):
+    """
+    Run detection and incident logic over a video stream.
+
+    In headless mode no overlay is drawn and no window is opened; an
+    annotated preview is only rendered when a preview sink is configured.
+    """
+    if headless is None:
+        headless = settings.headless
     
-    cap = cv2.VideoCapture(stream_url)
+    capture_options = load_capture_options(camera_id)
+    cap = open_capture(stream_url, capture_options)
     if not cap.isOpened():
         print("Error: Unable to open video stream")
         return
     
-    # Initialize frame buffer
-    frame_buffer = FrameBuffer(max_size=settings.frame_buffer_size)
+    processor = StreamProcessor(camera_id=camera_id, rules=rules, detection_log=open_detection_log(camera_id))
+    preview = create_preview_sink(settings.preview_mode, draw_detections, settings)
     
     # Ensure MinIO bucket exists
     create_bucket_if_not_exists(settings.minio_bucket)
     
-    print(f"Processing stream: {stream_url}")
-    print(f"Confidence threshold: {settings.confidence_threshold}")
+    print(f"Processing stream: {stream_url} (camera: {camera_id}, capture: {capture_options['backend']})")
+    print(f"Confidence threshold: {model.confidence_threshold}")
+    if headless:
+        print("Headless mode: overlay rendering and display disabled")
     
     frame_count = 0
-    last_detection_time = 0
-    detection_cooldown = 5000  # 5 seconds cooldown between detections
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("End of stream or error reading frame")
-            break
-        
-        current_time = cv2.getTickCount()
-        timestamp = datetime.now()
-        
-        # Add frame to buffer
-        frame_buffer.add_frame(frame, timestamp)
-        
-        # Run inference
-        detections = model.infer(frame)
-        
-        # Draw detections on frame for visualization
-        for det in detections:
-            bbox = det['bbox']
-            x, y, width, height = bbox
-            h, w = frame.shape[:2]
-            # Convert from YOLO format to pixel coordinates
-            x1 = int((x - width/2) * w / 640)
-            y1 = int((y - height/2) * h / 640)
-            x2 = int((x + width/2) * w / 640)
-            y2 = int((y + height/2) * h / 640)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                print("End of stream or error reading frame")
+                break
             
-            class_id = det['class_id']
-            confidence = det['confidence']
-            class_name = COCO_CLASSES[class_id] if class_id < len(COCO_CLASSES) else f"class_{class_id}"
+            metrics.FRAMES_READ.labels(camera=camera_id).inc()
+            timestamp = datetime.now(timezone.utc)
             
-            # Draw rectangle and label
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            label = f"{class_name}: {confidence:.2f}"
-            cv2.putText(frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        
-        # Add info overlay
-        cv2.putText(frame, f"Detections: {len(detections)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-        cv2.putText(frame, f"Frame: {frame_count}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-        
-        # Process detections for incidents (only certain classes)
-        if detections and (current_time - last_detection_time) > detection_cooldown * cv2.getTickFrequency() / 1000:
-            for detection in detections:
-                class_id = detection['class_id']
-                
-                # Only process if it's in our incident mapping
-                if class_id in COCO_TO_INCIDENT:
-                    incident_type = COCO_TO_INCIDENT[class_id]
-                    class_name = COCO_CLASSES[class_id] if class_id < len(COCO_CLASSES) else f"class_{class_id}"
-                    confidence = detection['confidence']
-                    
-                    print(f"\n🚨 INCIDENT DETECTED: {class_name} -> {incident_type} (confidence: {confidence:.2f})")
-                    
-                    incident_id = f"incident_{timestamp.strftime('%Y%m%d%H%M%S%f')}"
-                    
-                    # Extract spaced frames from buffer
-                    selected_frames, _ = frame_buffer.get_spaced_frames(
-                        num_frames=settings.frames_to_extract,
-                        spacing_ms=200
-                    )
-                    
-                    # Upload frames to MinIO
-                    print(f"Uploading {len(selected_frames)} frames to MinIO...")
-                    frame_urls = upload_frames_to_minio(selected_frames, incident_id)
-                    
-                    if frame_urls:
-                        # Create event payload
-                        event = {
-                            "id": incident_id,
-                            "incident": incident_type,
-                            "confidence": confidence,
-                            "frames": frame_urls,
-                            "timestamp": timestamp.isoformat(),
-                            "location": {
-                                "lat": settings.default_lat,
-                                "lon": settings.default_lon
-                            }
-                        }
-                        
-                        # Publish to Redis
-                        redis_client.publish('events', json.dumps(event))
-                        print(f"Event published to Redis: {incident_id}")
-                        
-                        last_detection_time = current_time
-                        break  # Process only first incident per cooldown period
-        
-        frame_count += 1
-        
-        # Display frame with detections
-        cv2.imshow('Smart City AI - Detection Stream', frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    
-    cap.release()
-    cv2.destroyAllWindows()
+            # Run inference
+            detections = model.detect(frame, processor.rules.inference_windows(frame.shape))
+            
+            # Apply rules and fire incidents (uses the frame before drawing)
+            processor.process_frame(frame, detections, timestamp)
+            
+            # Preview renders onto its own copy, at its own low rate
+            if preview is not None:
+                preview.submit(frame, detections, frame_count)
+            
+            if not headless:
+                # Draw detections on frame and display it
+                draw_detections(frame, detections, frame_count)
+                cv2.imshow('Smart City AI - Detection Stream', frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            
+            frame_count += 1
+    except KeyboardInterrupt:
+        print("\nStopping stream processing...")
+    finally:
+        cap.release()
+        if processor.detection_log is not None:
+            processor.detection_log.close()
+        if preview is not None:
+            preview.close()
+        if not headless:
+            cv2.destroyAllWindows()
 
 if __name__ == "__main__":
+    metrics.start_metrics_server(settings.vision_metrics_port)
+    rules = load_rules()
+    # The model's pre-filter must not discard detections a rule would accept
     model = YOLOv11Nano(
         model_path=settings.yolo_model_path,
-        confidence_threshold=settings.confidence_threshold
+        confidence_threshold=min(settings.confidence_threshold, rules.for_camera(settings.camera_id).min_threshold)
     )
-    process_stream(settings.stream_url, model)
\ No newline at end of file
+    process_stream(settings.stream_url, model, camera_id=settings.camera_id, rules=rules)
\ No newline at end of file